@@ -0,0 +1,226 @@
+"""
+Benchmark the generator on a fixed corpus of schemas
+
+Every schema in benchmark/schemas (flat, wide, deeply nested, array heavy, pattern heavy
+and ref heavy) is compiled once and generates --records records as NDJSON, reporting
+records per second and the peak memory traced while generating a tenth of them. Records
+are streamed, so the peak does not grow with the number of records. The microbenchmarks time
+single values of the plan nodes, such as strings from a format, a pattern or a keyword
+match, unique arrays and objects, in microseconds per value.
+
+All runs use the default config and a fixed seed, so two runs generate the same data.
+Save a run with --save and compare a later run against it with --compare, which marks the
+results that got worse than --threshold and exits with status 1 when any did.
+
+    python benchmark/generation.py --save generation.json
+    python benchmark/generation.py --compare generation.json
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import timeit
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.faker_config import app_config, configure_faker
+from src.generator import SchemaGenerator
+from src.output import OutputStream, write_records
+
+SCHEMA_DIR = os.path.join(ROOT, "benchmark", "schemas")
+SEED = 42
+
+# (name, field name, schema) of the values timed by the microbenchmarks. The field name
+# only matters for keyword matching, "x" matches no keyword.
+HANDLERS = [
+    ("string_default", "x", {"type": "string"}),
+    ("string_format", "x", {"type": "string", "format": "date-time"}),
+    ("string_pattern", "x", {"type": "string", "pattern": "^[A-Z]{3}-[0-9]{5}$"}),
+    ("string_keyword", "city", {"type": "string"}),
+    ("integer", "x", {"type": "integer", "minimum": 0, "maximum": 1000}),
+    ("number_multiple_of", "x", {"type": "number", "multipleOf": 0.01, "maximum": 100}),
+    ("boolean", "x", {"type": "boolean"}),
+    ("enum", "x", {"enum": ["new", "active", "suspended", "closed"]}),
+    ("array", "x", {"type": "array", "minItems": 10, "items": {"type": "integer"}}),
+    (
+        "array_unique",
+        "x",
+        {
+            "type": "array",
+            "minItems": 10,
+            "uniqueItems": True,
+            "items": {"type": "string", "pattern": "^[a-f0-9]{4}$"},
+        },
+    ),
+    (
+        "object",
+        "x",
+        {
+            "type": "object",
+            "properties": {
+                "a": {"type": "string"},
+                "b": {"type": "integer"},
+                "c": {"type": "boolean"},
+                "d": {"enum": [1, 2, 3]},
+            },
+        },
+    ),
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the generator.")
+    parser.add_argument(
+        "--records", "-n", type=int, default=1000, help="Records per schema (default 1000)"
+    )
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Compare with results saved by --save")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Change reported as a regression by --compare (default 0.1, 10%%)",
+    )
+    return parser.parse_args()
+
+
+def cli_args():
+    return argparse.Namespace(
+        schema=None, include_optional=True, keymatch=True, blank=False, start=0
+    )
+
+
+def make_generator():
+    return SchemaGenerator(app_config, configure_faker(app_config, SEED), SEED)
+
+
+# ----------------------------
+# Measuring
+# ----------------------------
+def bench_schema(path, count):
+    with open(path, "r", encoding="utf-8") as f:
+        schema = json.load(f)
+
+    generator = make_generator()
+    plan = generator.compile(schema, cli_args(), path)
+
+    def run(records):
+        out = OutputStream([])
+        write_records(generator.records(plan, SEED, records), out, "ndjson")
+        out.close()
+
+    start = time.perf_counter()
+    run(count)
+    elapsed = time.perf_counter() - start
+
+    # Traced separately on fewer records, as tracing slows the run down
+    tracemalloc.start()
+    run(max(1, count // 10))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {"records_per_s": count / elapsed, "peak_kb": peak / 1024}
+
+
+def bench_handler(field_name, schema):
+    generator = make_generator()
+    root = {"type": "object", "properties": {field_name: schema}}
+    node = generator.compile(root, cli_args()).properties[0][1]
+
+    timer = timeit.Timer(node.generate)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=3, number=number))
+    return {"us_per_value": best / number * 1e6}
+
+
+def run_benchmarks(count):
+    results = {}
+    for path in sorted(glob.glob(os.path.join(SCHEMA_DIR, "*.json"))):
+        name = "schema/" + os.path.splitext(os.path.basename(path))[0]
+        print(f"Running {name}", flush=True)
+        results[name] = bench_schema(path, count)
+
+    for name, field_name, schema in HANDLERS:
+        print(f"Running handler/{name}", flush=True)
+        results["handler/" + name] = bench_handler(field_name, schema)
+
+    return results
+
+
+# ----------------------------
+# Report
+# ----------------------------
+def change(result, baseline, threshold):
+    """Return the change from the baseline as text, and whether it is a regression."""
+    if not baseline:
+        return "", False
+    if "records_per_s" in result:
+        # Fewer records per second or more memory is worse
+        ratio = baseline["records_per_s"] / result["records_per_s"] - 1
+        memory = result["peak_kb"] / baseline["peak_kb"] - 1
+        text = f"{-ratio:+.0%} speed, {memory:+.0%} memory"
+        worse = ratio > threshold or memory > threshold
+    else:
+        ratio = result["us_per_value"] / baseline["us_per_value"] - 1
+        text = f"{ratio:+.0%} time"
+        worse = ratio > threshold
+    return text + (" ❌ worse" if worse else ""), worse
+
+
+def report(results, baseline, threshold):
+    regressions = []
+    print()
+    print(f"{'schema':<28}{'records/s':>12}{'peak KB':>10}  change")
+    for name, result in results.items():
+        if "records_per_s" not in result:
+            continue
+        text, worse = change(result, baseline.get(name), threshold)
+        print(f"{name:<28}{result['records_per_s']:>12.0f}{result['peak_kb']:>10.0f}  {text}")
+        if worse:
+            regressions.append(name)
+
+    print()
+    print(f"{'handler':<28}{'us/value':>12}  change")
+    for name, result in results.items():
+        if "us_per_value" not in result:
+            continue
+        text, worse = change(result, baseline.get(name), threshold)
+        print(f"{name:<28}{result['us_per_value']:>12.2f}  {text}")
+        if worse:
+            regressions.append(name)
+
+    return regressions
+
+
+# ----------------------------
+# Main
+# ----------------------------
+def main():
+    args = parse_args()
+
+    results = run_benchmarks(args.records)
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    regressions = report(results, baseline, args.threshold)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.save}")
+
+    if regressions:
+        print(f"\n❌ Worse than {args.compare}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Measure the startup time of Mocka
+
+Runs --version, a single schema and a schema from the clipboard, with the source entry point
+and with the onedir build from create_build.py (option 1) when it exists. Every case is run
+several times and the median and fastest wall time are reported. For the source entry point,
+-X importtime shows the time spent importing and the slowest top level imports. The frozen
+build does not take -X options, so only its wall time is measured.
+
+Save a run with --save and compare a later run against it with --compare, which marks the
+cases that got slower than --threshold and exits with status 1 when any did.
+
+    python benchmark/startup.py --save startup.json
+    python benchmark/startup.py --compare startup.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(ROOT, "mocka.py")
+SCHEMA = os.path.join(ROOT, "test", "generalSchemaExample.json")
+BUILD = os.path.join(ROOT, "dist", "mocka", "mocka.exe" if os.name == "nt" else "mocka")
+
+CASES = {
+    "version": ["--version"],
+    "schema": [SCHEMA, "--seed", "1"],
+    "clipboard": ["--seed", "1"],
+}
+
+# Top level imports listed for each case
+TOP_IMPORTS = 8
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Measure the startup time of Mocka.")
+    parser.add_argument("--runs", "-r", type=int, default=10, help="Runs per case (default 10)")
+    parser.add_argument("--build", default=BUILD, help=f"Onedir executable (default {BUILD})")
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Compare with results saved by --save")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Slowdown reported as a regression by --compare (default 0.1, 10%%)",
+    )
+    return parser.parse_args()
+
+
+# ----------------------------
+# Measuring
+# ----------------------------
+def time_runs(cmd, runs, cwd):
+    # One run first, which also creates the default app.config in cwd
+    subprocess.run(cmd, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(cmd, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append((time.perf_counter() - start) * 1000)
+    return {"median_ms": statistics.median(times), "min_ms": min(times)}
+
+
+def import_times(cmd, cwd):
+    """Run once with -X importtime and return the total and the slowest top level imports."""
+    stderr = subprocess.run(
+        [cmd[0], "-X", "importtime"] + cmd[1:],
+        cwd=cwd,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    ).stderr
+
+    total = 0
+    top = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        total += int(self_us)
+        if not name.startswith("  "):
+            top.append((name.strip(), int(cumulative_us) / 1000))
+
+    top.sort(key=lambda item: item[1], reverse=True)
+    return {"import_ms": total / 1000, "top_imports": top[:TOP_IMPORTS]}
+
+
+def set_clipboard(text):
+    """Put text in the clipboard and return what was there, or raise when there is none."""
+    import pyperclip
+
+    previous = pyperclip.paste()
+    pyperclip.copy(text)
+    return previous
+
+
+def run_cases(entries, runs):
+    results = {}
+    with open(SCHEMA, "r", encoding="utf-8") as f:
+        schema_text = f.read()
+
+    try:
+        previous_clipboard = set_clipboard(schema_text)
+    except Exception as err:
+        print(f"⚠️ Skipping the clipboard case, no clipboard: {err}")
+        previous_clipboard = None
+
+    try:
+        with tempfile.TemporaryDirectory() as cwd:
+            for entry, base_cmd in entries.items():
+                for case, case_args in CASES.items():
+                    if case == "clipboard" and previous_clipboard is None:
+                        continue
+
+                    name = f"{entry}/{case}"
+                    print(f"Running {name}", flush=True)
+                    result = time_runs(base_cmd + case_args, runs, cwd)
+                    if entry == "source":
+                        result.update(import_times(base_cmd + case_args, cwd))
+                    results[name] = result
+    finally:
+        if previous_clipboard is not None:
+            set_clipboard(previous_clipboard)
+
+    return results
+
+
+# ----------------------------
+# Report
+# ----------------------------
+def report(results, baseline, threshold):
+    regressions = []
+    print()
+    print(f"{'case':<20}{'median ms':>12}{'min ms':>10}{'import ms':>12}  change")
+    for name, result in results.items():
+        import_ms = result.get("import_ms")
+        change = ""
+        if name in baseline:
+            ratio = result["median_ms"] / baseline[name]["median_ms"] - 1
+            change = f"{ratio:+.0%}"
+            if ratio > threshold:
+                change += " ❌ slower"
+                regressions.append(name)
+        import_text = "-" if import_ms is None else f"{import_ms:.1f}"
+        print(
+            f"{name:<20}{result['median_ms']:>12.1f}{result['min_ms']:>10.1f}"
+            f"{import_text:>12}  {change}"
+        )
+
+    for name, result in results.items():
+        if result.get("top_imports"):
+            print(f"\nSlowest imports, {name}:")
+            for module, cumulative_ms in result["top_imports"]:
+                print(f"  {cumulative_ms:>8.1f} ms  {module}")
+
+    return regressions
+
+
+# ----------------------------
+# Main
+# ----------------------------
+def main():
+    args = parse_args()
+
+    entries = {"source": [sys.executable, SCRIPT]}
+    if os.path.isfile(args.build):
+        entries["build"] = [args.build]
+    else:
+        print(f"⚠️ No build at {args.build}, run create_build.py 1 to measure it")
+
+    results = run_cases(entries, args.runs)
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    regressions = report(results, baseline, args.threshold)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.save}")
+
+    if regressions:
+        print(f"\n❌ Slower than {args.compare}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,23 +4,45 @@
 """
 This main file initiates the cli, reads files and then calls the function to generate the output
 """
+
 __version__ = "0.0.8"
 
+import io
 import sys
 import json
+import time
 import logging
+import multiprocessing
+from contextlib import ExitStack
+from functools import partial
 from pathlib import Path
-import pyperclip
-from src.cli import parse_args
-from src.generator import SchemaGenerator
+from src.cli import parse_args, parse_batch_args, parse_serve_args
 from src.file_loader import load_schema, load_config
-from src.faker_config import configure_faker, app_config
+from src.compression import compressed_path
+from src.output import (
+    OutputStream,
+    open_output_file,
+    write_chunks,
+    write_document,
+    write_records,
+)
+from src.tabular import TABLE_FORMATS, table_columns, write_parquet
+
+# Faker, the generator, the clipboard, the server and the process pools are slow to import,
+# so they are imported by the code paths that use them. See benchmark/startup.py.
 
 logger = logging.getLogger(__name__)
 
 
 def main():
     try:
+        if sys.argv[1:2] == ["serve"]:
+            run_server(parse_serve_args(sys.argv[2:]))
+            return
+        if sys.argv[1:2] == ["batch"]:
+            run_batch_command(parse_batch_args(sys.argv[2:]))
+            return
+
         args = parse_args()
 
         setup_logging(args.debug)
@@ -29,40 +51,195 @@ def main():
             print(f"{__version__}")
             return
 
-        config_path = Path(args.config)
-        if not config_path.exists():
-            if args.config == "app.config":
-                logger.info("Generated the config file app.config")
-                save_app_config(app_config, "app.config")
-            else:
-                logger.error("Config file not found: %s", config_path)
-                sys.exit(1)
+        from src.faker_config import configure_faker, resolve_seed
+        from src.generator import SchemaGenerator
+
+        config = read_config(args.config)
+        seed = resolve_seed(config, args.seed)
+        faker = configure_faker(config, seed)
+        profiler = None
+        if args.profile or args.profile_json:
+            from src.profiler import Profiler
 
-        config = load_config(args.config)
-        faker = configure_faker(config, args.seed)
-        generator = SchemaGenerator(config, faker)
-        schema = load_schema(args.schema)
+            profiler = Profiler()
+        generator = SchemaGenerator(config, faker, seed, profiler)
+        if not args.no_cache:
+            # A large schema is kept prepared for the next run, see src/cache.py
+            from src.cache import open_prepared_schema
 
-        # Optionally resolve $ref first
+            generator.prepared_schema = open_prepared_schema(config, args, __version__)
+        schema = load_schema(args.schema, generator.prepared_schema)
+
+        # A $ref is resolved later, when the schema is compiled
         schema = generator.prepare_schema(schema)
 
-        result = generator.generate(schema, args)
+        # The columns of CSV, TSV and Parquet come from the properties of the compiled plan
+        plan = columns = None
+        if args.format in TABLE_FORMATS:
+            plan = generator.compile(schema, args, args.schema)
+            columns = table_columns(plan)
 
-        output = json.dumps(result, ensure_ascii=False, indent=2)
+        if args.format == "parquet":
+            if not args.out_file:
+                raise ValueError("--format parquet is written to a file, add --out-file")
+            records = generator.records(plan, seed, args.count, args.start)
+            write = partial(
+                write_parquet,
+                records,
+                columns,
+                args.out_path,
+                args.compress,
+                args.compress_level,
+            )
+        elif args.workers > 1 and args.count > 1 and not profiler:
+            from src.sharding import generate_shards
 
-        if args.out_file:
-            Path("mocked_data.json").write_text(output, encoding="utf-8")
-            logger.info("JSON written to %s", "mocked_data.json")
-        if args.out_clip:
-            logger.info("Generated data in the clipboard")
-            pyperclip.copy(output)
-        if args.no_console:
-            print(output)
+            chunks = generate_shards(config, schema, args, seed, args.workers)
+            write = partial(
+                write_chunks,
+                chunks,
+                output_format=args.format,
+                compact=args.compact,
+                columns=columns,
+            )
+        elif args.count == 1 and args.format == "json":
+            plan = generator.compile(schema, args, args.schema)
+            document = generator.document(plan, seed, args.start)
+            write = partial(write_document, document, compact=args.compact)
+        else:
+            plan = plan or generator.compile(schema, args, args.schema)
+            records = generator.records(plan, seed, args.count, args.start)
+            write = partial(
+                write_records,
+                records,
+                output_format=args.format,
+                compact=args.compact,
+                columns=columns,
+            )
+
+        if profiler:
+            profiler.start()
+            write_output(write, args)
+            profiler.stop(args.count)
+            write_profile(profiler, args)
+        else:
+            write_output(write, args)
 
     except Exception as e:
         print(e)
 
 
+def run_batch_command(args):
+    """Generate a file for every schema found, with the config and Faker loaded once"""
+    from src.batch import find_schemas, run_batch
+    from src.faker_config import resolve_seed
+
+    setup_logging(args.debug)
+    config = read_config(args.config)
+    schemas = find_schemas(args.schemas)
+    if not schemas:
+        logger.error("No schemas found")
+        sys.exit(1)
+
+    seed = resolve_seed(config, args.seed)
+    start = time.perf_counter()
+    failed = run_batch(config, schemas, args, seed, args.workers)
+    logger.info(
+        "Generated %d of %d schemas into %s in %.2fs (seed %d)",
+        len(schemas) - failed,
+        len(schemas),
+        args.out_dir,
+        time.perf_counter() - start,
+        seed,
+    )
+    if failed:
+        sys.exit(1)
+
+
+def run_server(args):
+    """Load the config once and answer generate requests until interrupted"""
+    from src.server import serve
+
+    setup_logging(args.debug)
+    serve(read_config(args.config), args.host, args.port)
+
+
+def read_config(config_arg: str) -> dict:
+    """Load the config file, creating the default app.config when it is missing"""
+    config_path = Path(config_arg)
+    if not config_path.exists():
+        if config_arg == "app.config":
+            from src.faker_config import app_config
+
+            logger.info("Generated the config file app.config")
+            save_app_config(app_config, "app.config")
+        else:
+            logger.error("Config file not found: %s", config_path)
+            sys.exit(1)
+
+    return load_config(config_arg)
+
+
+def write_output(write, args):
+    """Stream the records to the console, the output file and the clipboard as they are made"""
+    if args.format == "parquet":
+        # Parquet is binary, write puts it in the output file by itself
+        start = time.perf_counter()
+        count = write()
+        elapsed = time.perf_counter() - start
+        clipboard = None
+    else:
+        count, elapsed, clipboard = _write_text_output(write, args)
+
+    if args.count > 1:
+        logger.info(
+            "Generated %d records in %.2fs (%.0f records/s)",
+            count,
+            elapsed,
+            count / elapsed if elapsed else 0,
+        )
+    if args.out_file:
+        logger.info("Output written to %s", args.out_path)
+    if clipboard:
+        import pyperclip
+
+        logger.info("Generated data in the clipboard")
+        pyperclip.copy(clipboard.getvalue().removesuffix("\n"))
+
+
+def _write_text_output(write, args):
+    with ExitStack() as stack:
+        targets = []
+        if args.no_console:
+            targets.append(sys.stdout)
+        if args.out_file:
+            args.out_path = compressed_path(args.out_path, args.compress)
+            file = open_output_file(
+                args.out_path, args.compress, args.compress_level, args.compress_thread
+            )
+            targets.append(stack.enter_context(file))
+        clipboard = io.StringIO() if args.out_clip else None
+        if clipboard:
+            targets.append(clipboard)
+
+        out = OutputStream(targets)
+        start = time.perf_counter()
+        count = write(out)
+        out.close()
+        elapsed = time.perf_counter() - start
+    return count, elapsed, clipboard
+
+
+def write_profile(profiler, args):
+    """Print the --profile report to stderr and write it to --profile-json"""
+    if args.profile:
+        print(profiler.report(), file=sys.stderr)
+    if args.profile_json:
+        with open(args.profile_json, "w", encoding="utf-8") as file:
+            json.dump(profiler.to_dict(), file, indent=2)
+        logger.info("Profile written to %s", args.profile_json)
+
+
 def setup_logging(debug: bool = False):
     level = logging.DEBUG if debug else logging.INFO
     logging.basicConfig(level=level, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
@@ -91,4 +268,5 @@ def save_app_config(json_obj: dict, output_path: str):
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     main()
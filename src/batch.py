@@ -0,0 +1,236 @@
+"""
+Functions for generating data for many schemas in one run
+
+The config and Faker are loaded once, and every schema is reseeded with the run seed, so
+each output file is the same as a separate run of that schema with the same seed.
+Schemas with foreign keys to other schemas of the run are generated after them, see
+src/references.py, and take their keys from the records generated for them.
+"""
+
+import glob
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from src.compression import COMPRESSIONS
+from src.faker_config import FakerCache
+from src.file_loader import InputLoadError, load_document
+from src.generator import SchemaGenerator
+from src.output import OutputStream, open_output_file, write_document, write_records
+from src.plan import ConstNode
+from src.tabular import table_columns, write_parquet
+from src.references import (
+    DEFAULT_KEY_SAMPLE_SIZE,
+    KeyIndex,
+    find_foreign_keys,
+    order_schemas,
+    parse_foreign_key,
+)
+
+logger = logging.getLogger(__name__)
+
+_worker_state = {}
+
+
+def find_schemas(patterns) -> list[str]:
+    """Expand schema files, directories (searched recursively) and glob patterns."""
+    found = set()
+    for pattern in patterns:
+        matches = [pattern] if os.path.exists(pattern) else glob.glob(pattern, recursive=True)
+        count = len(found)
+        for match in matches:
+            if os.path.isdir(match):
+                found.update(
+                    os.path.join(root, name)
+                    for root, _, files in os.walk(match)
+                    for name in files
+                    if name.endswith(".json")
+                )
+            elif os.path.isfile(match):
+                found.add(match)
+        if len(found) == count:
+            logger.warning("No schemas found for %s", pattern)
+
+    return sorted(os.path.abspath(path) for path in found)
+
+
+def output_paths(
+    schemas: list[str], out_dir: str, output_format: str, compression: str | None = None
+) -> list[str]:
+    """Place the output files under out_dir, mirroring the folders the schemas are in."""
+    root = os.path.commonpath([os.path.dirname(path) for path in schemas])
+    extension = "." + output_format
+    # Parquet compresses its columns inside the file
+    if compression and output_format != "parquet":
+        extension += COMPRESSIONS[compression]
+    return [
+        os.path.join(out_dir, os.path.splitext(os.path.relpath(path, root))[0] + extension)
+        for path in schemas
+    ]
+
+
+def run_batch(config: dict, schemas: list[str], args, seed: int, workers: int = 1) -> int:
+    """
+    Generate args.count records for every schema into its own file under args.out_dir.
+    A schema that fails is logged and skipped. Returns the number of failed schemas.
+    """
+    jobs = list(zip(schemas, output_paths(schemas, args.out_dir, args.format, args.compress)))
+    jobs, key_fields = _link_schemas(jobs)
+
+    failed = 0
+    for schema_path, error in _run_jobs(jobs, config, args, seed, workers, key_fields):
+        if error:
+            failed += 1
+            logger.error("%s: %s", schema_path, error)
+        else:
+            logger.debug("Generated %s", schema_path)
+    return failed
+
+
+def _link_schemas(jobs):
+    """
+    Find the foreign keys between the schemas. Returns the jobs in an order where every
+    schema comes after the schemas it refers to, and the foreign keys whose keys are
+    collected from each schema.
+    """
+    paths_by_name = {}
+    for schema_path, _ in jobs:
+        name = os.path.splitext(os.path.basename(schema_path))[0]
+        paths_by_name.setdefault(name, []).append(schema_path)
+
+    dependencies = {}
+    key_fields = {}
+    for schema_path, _ in jobs:
+        try:
+            foreign_keys = find_foreign_keys(load_document(schema_path))
+        except InputLoadError:
+            # Reported when the schema is generated
+            continue
+        for foreign_key in sorted(foreign_keys):
+            try:
+                name = parse_foreign_key(foreign_key)[0]
+            except ValueError:
+                continue
+            parents = paths_by_name.get(name)
+            if not parents:
+                logger.warning(
+                    "%s: no schema %s in this run for %s", schema_path, name, foreign_key
+                )
+                continue
+            if len(parents) > 1:
+                raise ValueError(f"{foreign_key} can refer to any of {', '.join(parents)}")
+            dependencies.setdefault(schema_path, set()).add(parents[0])
+            key_fields.setdefault(parents[0], set()).add(foreign_key)
+
+    if not key_fields:
+        return jobs, {}
+    out_paths = dict(jobs)
+    order = order_schemas([schema_path for schema_path, _ in jobs], dependencies)
+    return [(schema_path, out_paths[schema_path]) for schema_path in order], key_fields
+
+
+def _run_jobs(jobs, config, args, seed, workers, key_fields=None):
+    # Schemas with foreign keys need the keys of the schemas before them, so run in order
+    if workers > 1 and len(jobs) > 1 and not key_fields:
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(config, args, seed)
+        ) as executor:
+            # Send the schemas in chunks, generating one takes about a millisecond
+            chunksize = max(1, len(jobs) // (workers * 8))
+            yield from executor.map(_generate_job, jobs, chunksize=chunksize)
+    else:
+        _init_worker(config, args, seed, key_fields)
+        yield from map(_generate_job, jobs)
+
+
+def _init_worker(config, args, seed, key_fields=None):
+    _worker_state.update(
+        config=config,
+        args=args,
+        seed=seed,
+        fakers=FakerCache(config),
+        key_fields=key_fields or {},
+        keys={},
+    )
+
+
+def _generate_job(job) -> tuple[str, str | None]:
+    schema_path, out_path = job
+    try:
+        _generate_file(schema_path, out_path)
+        return schema_path, None
+    except Exception as err:
+        return schema_path, str(err) or type(err).__name__
+
+
+def _generate_file(schema_path: str, out_path: str):
+    config = _worker_state["config"]
+    args = _worker_state["args"]
+
+    schema = load_document(schema_path)
+    seed = _worker_state["seed"]
+    generator = SchemaGenerator(config, _worker_state["fakers"].get(seed), seed)
+    generator.foreign_keys = keys = _worker_state["keys"]
+    _check_foreign_keys(schema)
+    plan = generator.compile(generator.prepare_schema(schema), args, schema_path)
+
+    # The keys other schemas refer to are collected while the records are written
+    sample_size = config.get("foreign_key_sample_size", DEFAULT_KEY_SAMPLE_SIZE)
+    indexes = [
+        (KeyIndex(foreign_key, seed, sample_size), parse_foreign_key(foreign_key)[1])
+        for foreign_key in sorted(_worker_state["key_fields"].get(schema_path, ()))
+    ]
+
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    try:
+        if args.format == "parquet":
+            records = generator.records(plan, seed, args.count, args.start)
+            if indexes:
+                records = _collect_keys(records, indexes)
+            columns = table_columns(plan)
+            write_parquet(records, columns, out_path, args.compress, args.compress_level)
+        else:
+            _write_file(generator, plan, out_path, indexes)
+    except Exception:
+        # Do not leave a half written file behind
+        if os.path.exists(out_path):
+            os.remove(out_path)
+        raise
+
+    for index, _ in indexes:
+        keys[index.name] = index
+
+
+def _write_file(generator, plan, out_path, indexes):
+    args = _worker_state["args"]
+    seed = _worker_state["seed"]
+    file = open_output_file(out_path, args.compress, args.compress_level, args.compress_thread)
+    with file:
+        out = OutputStream([file])
+        if args.count == 1 and args.format == "json":
+            if indexes:
+                records = generator.records(plan, seed, 1, args.start)
+                document = ConstNode(next(_collect_keys(records, indexes)))
+            else:
+                document = generator.document(plan, seed, args.start)
+            write_document(document, out, args.compact)
+        else:
+            records = generator.records(plan, seed, args.count, args.start)
+            if indexes:
+                records = _collect_keys(records, indexes)
+            write_records(records, out, args.format, args.compact, table_columns(plan))
+        out.close()
+
+
+def _check_foreign_keys(schema):
+    """Fail a schema whose foreign keys refer to a schema of the run that failed."""
+    linked = set().union(*_worker_state["key_fields"].values())
+    for foreign_key in sorted(find_foreign_keys(schema)):
+        if foreign_key in linked and foreign_key not in _worker_state["keys"]:
+            raise ValueError(f"There are no keys for {foreign_key}, its schema failed")
+
+
+def _collect_keys(records, indexes):
+    for record in records:
+        for index, path in indexes:
+            index.add_record(record, path)
+        yield record
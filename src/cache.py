@@ -0,0 +1,154 @@
+"""
+An on-disk cache of prepared schemas, kept between runs
+
+A $ref is resolved while compiling, so a plan is usually compiled from a small part of a
+large schema. After a run, that part is kept in the cache directory with the keyword
+matches made while compiling it, see PreparedSchema. A later run of the same schema text
+with the same config and options loads this prepared schema instead of parsing the whole
+file, and does not match its fields again.
+
+The files are named by a hash of the schema text, the config, the compile options, the
+Mocka version and CACHE_FORMAT. A changed input gets a new name, so entries never need to
+be invalidated, and the least recently used files are removed when there are more than
+CACHE_MAX_FILES. A schema with a $ref to another file is not cached, as that file could
+change which parts of the schema are used.
+
+A cache that can not be read or written is skipped, the run then parses and compiles as
+usual. Only the user running Mocka should be able to write to the cache directory, as
+pickled files are trusted when they are loaded.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import sys
+
+logger = logging.getLogger(__name__)
+
+# Part of every key, raise it when the cached values change shape
+CACHE_FORMAT = 1
+
+# Files kept in the cache directory, the least recently used ones are removed first
+CACHE_MAX_FILES = 500
+
+CACHE_SUFFIX = ".pickle"
+
+# Schemas smaller than this are parsed faster than a cached copy is found and loaded
+PREPARED_MIN_SIZE = 1 << 16
+
+
+class DiskCache:
+    """Pickled values in a directory, by kind and the hash of what they were made from."""
+
+    def __init__(self, directory: str, version: str):
+        self.directory = directory
+        self.version = version
+
+    def key(self, *parts) -> str:
+        digest = hashlib.blake2b(digest_size=20)
+        for part in (self.version, CACHE_FORMAT, sys.version_info[:2], *parts):
+            data = part if isinstance(part, bytes) else repr(part).encode("utf-8")
+            digest.update(len(data).to_bytes(8, "big"))
+            digest.update(data)
+        return digest.hexdigest()
+
+    def load(self, kind: str, key: str):
+        """Return the value stored for a key, or None when there is none."""
+        path = self._path(kind, key)
+        try:
+            with open(path, "rb") as file:
+                value = pickle.load(file)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except Exception as err:
+            logger.debug("Unable to read cache file %s: %s", path, err)
+            return None
+        logger.debug("Loaded %s from the cache", kind)
+        return value
+
+    def save(self, kind: str, key: str, value):
+        path = self._path(kind, key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(temp_path, "wb") as file:
+                pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+            # Replaced in one step, so other runs never read a half written file
+            os.replace(temp_path, path)
+            self._prune()
+        except Exception as err:
+            logger.debug("Unable to write cache file %s: %s", path, err)
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _path(self, kind: str, key: str) -> str:
+        return os.path.join(self.directory, f"{kind}-{key}{CACHE_SUFFIX}")
+
+    def _prune(self):
+        with os.scandir(self.directory) as entries:
+            files = [entry for entry in entries if entry.name.endswith(CACHE_SUFFIX)]
+        if len(files) <= CACHE_MAX_FILES:
+            return
+        files.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in files[: len(files) - CACHE_MAX_FILES]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass  # Removed by another run
+
+
+class PreparedSchema:
+    """
+    The cache entry of a schema text, compiled with one config and set of options. load
+    returns the prepared schema of an earlier run, and the generator saves it after
+    compiling when there was none.
+    """
+
+    def __init__(self, disk_cache: DiskCache, config: dict, args):
+        self.disk_cache = disk_cache
+        # The seed does not change how a schema is compiled
+        config = {name: value for name, value in config.items() if name != "seed"}
+        self.options = (
+            json.dumps(config, sort_keys=True, default=str),
+            args.include_optional,
+            args.keymatch,
+            args.blank,
+        )
+        self.key = None
+        self.loaded = False
+        self.keyword_matches = {}
+
+    def load(self, raw: str) -> dict | None:
+        """Return the prepared schema for the text of a schema, or None if it is not cached."""
+        if len(raw) < PREPARED_MIN_SIZE:
+            return None
+        self.key = self.disk_cache.key(raw.encode("utf-8"), *self.options)
+        entry = self.disk_cache.load("schema", self.key)
+        if not isinstance(entry, dict):
+            return None
+        self.loaded = True
+        self.keyword_matches = entry["keyword_matches"]
+        return entry["schema"]
+
+    def save(self, schema: dict, keyword_matches: dict):
+        if self.key and not self.loaded:
+            entry = {"schema": schema, "keyword_matches": keyword_matches}
+            self.disk_cache.save("schema", self.key, entry)
+            self.loaded = True
+
+
+def default_cache_dir() -> str:
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "mocka")
+
+
+def open_prepared_schema(config: dict, args, version: str) -> PreparedSchema:
+    """Return the cache entry for a run, in the cache_dir config option or the user cache."""
+    disk_cache = DiskCache(config.get("cache_dir") or default_cache_dir(), version)
+    return PreparedSchema(disk_cache, config, args)
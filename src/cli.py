@@ -4,12 +4,26 @@ Provides command-line argument parsing for the Mocka tool.
 
 import argparse
 
+from src.compression import COMPRESSIONS
+from src.output import OUTPUT_FORMATS
+
+# Where mocka serve listens, also the defaults of server.serve
+DEFAULT_SERVE_HOST = "127.0.0.1"
+DEFAULT_SERVE_PORT = 8765
+
+# The file written by --out-file without --out-path, with the extension of --format
+DEFAULT_OUT_NAME = "mocked_data"
+
 
 def parse_args():
     """
     Parse command-line arguments for the Mocka JSON generation tool.
     """
-    parser = argparse.ArgumentParser(description="Generate JSON from schema.")
+    parser = argparse.ArgumentParser(
+        description="Generate JSON from schema.",
+        epilog="Run 'mocka batch --help' for many schemas in one run, "
+        "and 'mocka serve --help' for the server mode.",
+    )
     parser.add_argument("schema", nargs="?", help="Path to schema file (defaults to clipboard)")
     parser.add_argument("--version", "-v", action="store_true", help="Show version and exit")
     parser.add_argument("--debug", "-d", action="store_true", help="Print debug info")
@@ -19,22 +33,168 @@ def parse_args():
         default="app.config",
         help="Mocka config file (will create and use the default if no input given).",
     )
+    parser.add_argument("--out-file", "-of", help="Output to file.", action="store_true")
+    parser.add_argument("--out-clip", "-oc", help="Output to the clipboard.", action="store_true")
     parser.add_argument(
-        "--out-file", "-of",
-        help="Output to file.",
-        action="store_true"
+        "--no-console", "-nc", help="Do not output to console.", action="store_false", default=True
     )
     parser.add_argument(
-        "--out-clip", "-oc",
-        help="Output to the clipboard.",
-        action="store_true"
+        "--out-path",
+        "-op",
+        help="File written by --out-file (default mocked_data with the extension of --format, "
+        "such as mocked_data.json).",
     )
+    _add_output_arguments(parser)
     parser.add_argument(
-        "--no-console", "-nc",
-        help="Do not output to console.",
-        action="store_false",
-        default=True
+        "--workers",
+        "-w",
+        type=positive_int,
+        default=1,
+        help="Worker processes used with --count. Same seed and --count give the same output",
     )
+    _add_generation_arguments(parser)
+    parser.add_argument(
+        "--no-cache",
+        "-nca",
+        action="store_true",
+        help="Parse and compile the schema without the prepared copy in cache_dir",
+    )
+    parser.add_argument(
+        "--profile",
+        "-pr",
+        action="store_true",
+        help="Print the time spent per field path and Faker method. Runs in one process",
+    )
+    parser.add_argument(
+        "--profile-json",
+        "-pj",
+        metavar="PATH",
+        help="Write the --profile results to this JSON file",
+    )
+    args = parser.parse_args()
+    if args.out_path is None:
+        args.out_path = f"{DEFAULT_OUT_NAME}.{args.format}"
+    return args
+
+
+def parse_serve_args(argv):
+    """
+    Parse the arguments of 'mocka serve', which runs a local generate server.
+    """
+    parser = argparse.ArgumentParser(
+        prog="mocka serve",
+        description="Serve generate requests over HTTP, with Faker and schemas kept loaded.",
+    )
+    parser.add_argument("--debug", "-d", action="store_true", help="Print debug info")
+    parser.add_argument(
+        "--config",
+        "-c",
+        default="app.config",
+        help="Mocka config file (will create and use the default if no input given).",
+    )
+    parser.add_argument(
+        "--host",
+        default=DEFAULT_SERVE_HOST,
+        help=f"Address to listen on (default {DEFAULT_SERVE_HOST})",
+    )
+    parser.add_argument(
+        "--port",
+        "-p",
+        type=int,
+        default=DEFAULT_SERVE_PORT,
+        help=f"Port to listen on (default {DEFAULT_SERVE_PORT}, 0 picks a free port)",
+    )
+    return parser.parse_args(argv)
+
+
+def parse_batch_args(argv):
+    """
+    Parse the arguments of 'mocka batch', which generates data for many schemas in one run.
+    """
+    parser = argparse.ArgumentParser(
+        prog="mocka batch",
+        description="Generate JSON for every schema in directories or glob patterns, "
+        "with the config and Faker loaded once.",
+    )
+    parser.add_argument(
+        "schemas", nargs="+", help="Schema files, directories (searched recursively) or globs"
+    )
+    parser.add_argument("--debug", "-d", action="store_true", help="Print debug info")
+    parser.add_argument(
+        "--config",
+        "-c",
+        default="app.config",
+        help="Mocka config file (will create and use the default if no input given).",
+    )
+    parser.add_argument(
+        "--out-dir",
+        "-od",
+        default="mocked_data",
+        help="Directory for the output files, one per schema (default mocked_data).",
+    )
+    _add_output_arguments(parser)
+    parser.add_argument(
+        "--workers",
+        "-w",
+        type=positive_int,
+        default=1,
+        help="Worker processes, each schema is generated by one of them",
+    )
+    _add_generation_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def _add_output_arguments(parser):
+    parser.add_argument(
+        "--count",
+        "-n",
+        type=positive_int,
+        default=1,
+        help="Number of records to generate. More than one is written as a JSON array or NDJSON",
+    )
+    parser.add_argument(
+        "--start",
+        "-st",
+        type=non_negative_int,
+        default=0,
+        help="Index of the first record. Gives the same records as that part of a full run",
+    )
+    parser.add_argument(
+        "--format",
+        "-f",
+        choices=OUTPUT_FORMATS,
+        default="json",
+        help="Output format, json (default), ndjson with one compact record per line, or csv, "
+        "tsv or parquet with a column per field",
+    )
+    parser.add_argument(
+        "--compact",
+        "-cm",
+        action="store_true",
+        help="Write JSON without indentation and line breaks",
+    )
+    parser.add_argument(
+        "--compress",
+        "-z",
+        choices=COMPRESSIONS,
+        help="Compress output files, which get the extension of the codec. Files ending in "
+        ".gz, .bz2, .xz or .zst are compressed without it. zstd needs zstandard",
+    )
+    parser.add_argument(
+        "--compress-level",
+        "-zl",
+        type=int,
+        help="Compression level, the default of the codec if not given",
+    )
+    parser.add_argument(
+        "--compress-thread",
+        "-zt",
+        action="store_true",
+        help="Compress on a background thread while the records are generated",
+    )
+
+
+def _add_generation_arguments(parser):
     parser.add_argument(
         "--seed",
         "-s",
@@ -69,4 +229,17 @@ def parse_args():
         action="store_true",
         help="Generate blank values (empty strings, 0s, false, first enum, etc.)",
     )
-    return parser.parse_args()
+
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be 1 or more, got {value}")
+    return number
+
+
+def non_negative_int(value: str) -> int:
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"must be 0 or more, got {value}")
+    return number
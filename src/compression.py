@@ -0,0 +1,159 @@
+"""
+Compressed output files
+
+An output file is compressed while it is written when its name ends in .gz, .bz2, .xz or
+.zst, or when --compress names the codec. gzip, bz2 and xz use the standard library, zstd
+is optional and needs zstandard (pip install zstandard). The text passed to a file comes
+in the large chunks of OutputStream and is compressed a chunk at a time.
+
+With --compress-thread the chunks are compressed and written on a background thread, so
+generation goes on meanwhile. The codecs release the GIL while they compress, so the two
+run in parallel. At most COMPRESS_QUEUE_CHUNKS chunks wait for the thread, which keeps
+memory bounded when compressing is slower than generating.
+"""
+
+import bz2
+import lzma
+import queue
+import threading
+import zlib
+
+# Codec names used by --compress, with the file extension that selects each of them
+COMPRESSIONS = {"gzip": ".gz", "bz2": ".bz2", "xz": ".xz", "zstd": ".zst"}
+
+# Level used when --compress-level is not given, the usual default of each codec
+DEFAULT_LEVELS = {"gzip": 6, "bz2": 9, "xz": 6, "zstd": 3}
+
+# The levels each codec takes
+LEVELS = {"gzip": range(0, 10), "bz2": range(1, 10), "xz": range(0, 10), "zstd": range(1, 23)}
+
+# Chunks waiting for the --compress-thread writer before generation waits for it
+COMPRESS_QUEUE_CHUNKS = 4
+
+# Bytes buffered in front of the file, the compressed chunks are often small
+FILE_BUFFER_SIZE = 1 << 20
+
+
+def compression_for_path(path: str) -> str | None:
+    """Return the codec selected by the extension of a file name, or None."""
+    for name, extension in COMPRESSIONS.items():
+        if path.endswith(extension):
+            return name
+    return None
+
+
+def compressed_path(path: str, compression: str | None) -> str:
+    """Add the extension of a codec to a file name that does not end in one already."""
+    if not compression or compression_for_path(path):
+        return path
+    return path + COMPRESSIONS[compression]
+
+
+def open_compressed(path: str, compression: str, level: int | None = None, threaded=False):
+    """Open a text file that is compressed as it is written."""
+    file = CompressedFile(path, _compressor(compression, level))
+    return BackgroundWriter(file) if threaded else file
+
+
+class CompressedFile:
+    """A text file, UTF-8 encoded and compressed with a codec as it is written."""
+
+    def __init__(self, path: str, compressor):
+        self.compressor = compressor
+        self.file = open(path, "wb", buffering=FILE_BUFFER_SIZE)
+
+    def write(self, text: str):
+        self.file.write(self.compressor.compress(text.encode("utf-8")))
+
+    def flush(self):
+        # The codec is not flushed, that would end its block and compress worse
+        self.file.flush()
+
+    def close(self):
+        if self.file.closed:
+            return
+        try:
+            self.file.write(self.compressor.flush())
+        finally:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class BackgroundWriter:
+    """Passes the written text on to a file from a background thread."""
+
+    def __init__(self, file):
+        self.file = file
+        self._queue = queue.Queue(COMPRESS_QUEUE_CHUNKS)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="mocka-compress", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while (text := self._queue.get()) is not None:
+            try:
+                if self._error is None:
+                    self.file.write(text)
+            except Exception as err:  # Raised in the generating thread by write or close
+                self._error = err
+            finally:
+                self._queue.task_done()
+        self._queue.task_done()
+
+    def write(self, text: str):
+        self._raise_error()
+        self._queue.put(text)
+
+    def flush(self):
+        self._queue.join()
+        self._raise_error()
+        self.file.flush()
+
+    def close(self):
+        if not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self.file.close()
+        self._raise_error()
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def check_level(compression: str, level: int | None):
+    if level is not None and level not in LEVELS[compression]:
+        levels = LEVELS[compression]
+        raise ValueError(
+            f"{compression} takes a compression level from {levels.start} to {levels.stop - 1}"
+        )
+
+
+def _compressor(compression: str, level: int | None):
+    check_level(compression, level)
+    if level is None:
+        level = DEFAULT_LEVELS[compression]
+    if compression == "gzip":
+        # wbits 31 writes the gzip header, with no file name or time, so runs stay the same
+        return zlib.compressobj(level, zlib.DEFLATED, 31)
+    if compression == "bz2":
+        return bz2.BZ2Compressor(level)
+    if compression == "xz":
+        return lzma.LZMACompressor(preset=level)
+    try:
+        import zstandard
+    except ImportError as err:  # zstandard is optional
+        raise ValueError("zstd compression needs zstandard, pip install zstandard") from err
+    return zstandard.ZstdCompressor(level=level).compressobj()
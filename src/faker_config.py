@@ -1,67 +1,228 @@
 """
 Functions for initiating and configuring Faker
+
+locale can be one locale, a list of locales or an object of locale to weight, and
+locale_mode picks one of them for the whole run (run), for each record (record) or for
+each Faker value (field).
 """
 
 import importlib
 import random
 import logging
-from faker import Faker
 
 logger = logging.getLogger(__name__)
 
 
+LOCALE_MODES = ("run", "record", "field")
+
+
 def configure_faker(config: dict = None, cli_seed: int = None):
     """Create and configure a Faker instance using config and optional CLI seed."""
     logger.debug("Running function configure_faker")
 
     config = config or {}
+    resolved_seed = resolve_seed(config, cli_seed)
+    return FakerCache(config).get(resolved_seed)
 
-    # Faker does not support multiple locales simultaneously in a single instance.
-    # If a list is provided, we pick one randomly to preserve variability.
+
+def locale_weights(config: dict) -> tuple[list[str], list[float] | None]:
+    """
+    Return the configured locales and their weights, or None for equal weights.
+    locale is a single locale, a list of locales or an object of locale to weight.
+    """
     locale_config = config.get("locale")
 
-    if isinstance(locale_config, list):
-        selected_locale = random.choice(locale_config)
-    elif isinstance(locale_config, str):
-        selected_locale = locale_config
-    else:
-        # Fallback option set to US
-        selected_locale = "en_US"
+    if isinstance(locale_config, dict):
+        weights = list(locale_config.values())
+        valid = all(
+            isinstance(weight, (int, float)) and not isinstance(weight, bool) and weight >= 0
+            for weight in weights
+        )
+        if not valid or not sum(weights):
+            raise ValueError(f"locale weights must be numbers of 0 or more: {locale_config}")
+        return list(locale_config), weights
+    if isinstance(locale_config, list) and locale_config:
+        return locale_config, None
+    if isinstance(locale_config, str):
+        return [locale_config], None
+    # Fallback option set to US
+    return ["en_US"], None
 
-    faker_instance = Faker(selected_locale)
 
-    # CLI seed takes precedence to allow reproducible runs from outside config.
-    resolved_seed = cli_seed if cli_seed is not None else config.get("seed")
+def locale_mode(config: dict) -> str:
+    """Return how often the locale is picked: once per run, per record or per field."""
+    mode = config.get("locale_mode", "run")
+    if mode not in LOCALE_MODES:
+        raise ValueError(f"locale_mode must be one of {', '.join(LOCALE_MODES)}: {mode}")
+    return mode
 
-    # Treat 0 as "no seed" and randomize it.
-    if resolved_seed in (None, 0):
-        resolved_seed = random.randint(1, 999999)
 
-    # Seed both Faker and Python's random to keep all randomness aligned.
-    faker_instance.seed_instance(resolved_seed)
-    random.seed(resolved_seed)
+def select_locale(config: dict, seed: int) -> str:
+    """Return the locale to use for a run with the given seed."""
+    # A Faker instance has one locale. With locale_mode run one of the locales is picked
+    # for the whole run, following the seed, so seeded runs always get the same locale.
+    locales, weights = locale_weights(config)
+
+    if weights:
+        return random.Random(seed).choices(locales, weights)[0]
+    if isinstance(config.get("locale"), list):
+        return random.Random(seed).choice(locales)
+    return locales[0]
+
 
-    # Register additional providers:
-    # Only applied when using a single locale, since multi-locale setups
-    # can lead to inconsistent provider availability.
-    if not isinstance(locale_config, list):
-        for provider_name in config.get("providers", []):
+def create_faker(config: dict, locale: str):
+    """Create an unseeded Faker instance for a locale, with the providers from config."""
+    # Faker takes a good part of the startup time to import, so it is loaded when first used
+    from faker import Faker
+
+    faker_instance = Faker(locale)
+
+    # Register additional providers. With several locales, a provider's variant for the
+    # locale is used when Faker has one, so the values keep following the locale.
+    single_locale = isinstance(config.get("locale"), str)
+    for provider_name in config.get("providers", []):
+        module_paths = [f"faker.providers.{provider_name}"]
+        if not single_locale:
+            module_paths.insert(0, f"faker.providers.{provider_name}.{locale}")
+        for module_path in module_paths:
             try:
-                module_path = f"faker.providers.{provider_name}"
                 provider_module = importlib.import_module(module_path)
                 faker_instance.add_provider(provider_module.Provider)
+                break
             except (ImportError, AttributeError, ModuleNotFoundError):
-                logger.warning("Faker provider '%s' not found. Skipping.", provider_name)
+                continue
+        else:
+            logger.warning("Faker provider '%s' not found. Skipping.", provider_name)
 
     return faker_instance
 
 
+def seed_faker(faker_instance, seed: int):
+    """Seed a Faker instance. The generator using it is seeded with the same seed."""
+    faker_instance.seed_instance(seed)
+
+
+class FakerCache:
+    """
+    Faker instances for one config, created once per locale and reseeded for each run,
+    which gives the same values as configure_faker with the same seed.
+    """
+
+    def __init__(self, config: dict):
+        self.config = config
+        self.mode = locale_mode(config)
+        self.locales, self.weights = locale_weights(config)
+        self._fakers = {}
+        if self.mode == "record" and len(self.locales) > 1 and config.get("faker_pool_size"):
+            logger.warning("faker_pool_size is not used with locale_mode record")
+
+    def warm_up(self):
+        """Create the Faker instances for the configured locales before they are needed."""
+        for locale in self.locales:
+            self.instance(locale)
+
+    def get(self, seed: int):
+        """
+        Return the seeded Faker for a run with a resolved seed. With locale_mode record or
+        field this is a MultiLocaleFaker. The instances are shared by the runs of this
+        cache, so a cache is used by one generator at a time.
+        """
+        if self.mode != "run" and len(self.locales) > 1:
+            return MultiLocaleFaker(self, seed)
+
+        faker_instance = self.instance(select_locale(self.config, seed))
+        seed_faker(faker_instance, seed)
+        return faker_instance
+
+    def instance(self, locale: str):
+        """Return the unseeded Faker for a locale, creating it on first use."""
+        faker_instance = self._fakers.get(locale)
+        if faker_instance is None:
+            logger.debug("Creating Faker for locale %s", locale)
+            faker_instance = self._fakers[locale] = create_faker(self.config, locale)
+        return faker_instance
+
+
+class MultiLocaleFaker:
+    """
+    Stands in for a Faker instance and serves every call from one of several locales.
+    With locale_mode record, next_record() picks the locale for the next record. With
+    locale_mode field, a locale is picked for every Faker value.
+
+    The picks come from their own random generator seeded by the run seed, and each
+    locale's Faker is seeded from the run seed and the locale the first time it is used,
+    so a seeded run gives the same values whatever order the locales are first used in.
+    """
+
+    def __init__(self, cache: FakerCache, seed: int):
+        self._cache = cache
+        self._per_field = cache.mode == "field"
+        self.seed_instance(seed)
+
+    def seed_instance(self, seed: int):
+        """Start over from seed, as Faker.seed_instance does."""
+        self._seed = seed
+        self._rng = random.Random(f"{seed}-locale")
+        self._seeded = {}
+        self._current = None
+
+    @property
+    def per_record(self) -> bool:
+        return not self._per_field
+
+    def next_record(self):
+        """Pick the locale for the next record, with locale_mode record."""
+        if not self._per_field:
+            self._current = self._faker(self._choose())
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if self._per_field or self._current is None:
+            return getattr(self._faker(self._choose()), name)
+        return getattr(self._current, name)
+
+    def _choose(self) -> str:
+        locales, weights = self._cache.locales, self._cache.weights
+        if weights:
+            return self._rng.choices(locales, weights)[0]
+        return self._rng.choice(locales)
+
+    def _faker(self, locale: str):
+        faker_instance = self._seeded.get(locale)
+        if faker_instance is None:
+            faker_instance = self._seeded[locale] = self._cache.instance(locale)
+            faker_instance.seed_instance(f"{self._seed}-{locale}")
+        return faker_instance
+
+
+def resolve_seed(config: dict = None, cli_seed: int = None) -> int:
+    """Return the seed for a run, picking a random one when none is set."""
+    config = config or {}
+
+    # CLI seed takes precedence to allow reproducible runs from outside config.
+    resolved_seed = cli_seed if cli_seed is not None else config.get("seed")
+
+    # Treat 0 as "no seed" and randomize it.
+    if resolved_seed in (None, 0):
+        resolved_seed = random.randint(1, 999999)
+    return resolved_seed
+
+
 # fmt: off
 app_config = {
   "locale": ["sv_SE"],
+  "locale_mode": "run",
   "seed": 0,
   "providers": ["internet", "address", "company"],
   "max_array_length": 10,
+  "max_ref_depth": 3,
+  "faker_pool_size": 0,
+  "vectorized_arrays": False,
+  "unique_fields": [],
+  "unique_exact_limit": 1000000,
+  "foreign_key_sample_size": 1000000,
+  "cache_dir": "",
   "keyword_matching":
     [
       { "keywords": ["email", "e-mail", "mail"], "method": "email" },
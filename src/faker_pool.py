@@ -0,0 +1,59 @@
+"""
+Pools of Faker values for keyword matched fields
+
+Faker methods such as address or sentence are slow, so a batch of values is made once per
+pool and values are picked from it at random. Pools are keyed by method name and args, and
+filled from the seeded Faker, so a seeded run gives the same output with the same pool
+settings.
+"""
+
+import json
+
+
+class ValuePool:
+    """
+    Serves values picked at random with rng from a batch of size values made by fill().
+    The batch is made when the first value is needed, which bounds the Faker calls of very
+    large runs to size per pool.
+    """
+
+    __slots__ = ("fill", "size", "rng", "_values")
+
+    def __init__(self, fill, size: int, rng):
+        self.fill = fill
+        self.size = size
+        self.rng = rng
+        self._values = []
+
+    def clear(self):
+        self._values = []
+
+    def next(self):
+        values = self._values
+        if not values:
+            values = self._values = [self.fill() for _ in range(self.size)]
+        return self.rng.choice(values)
+
+
+class FakerPools:
+    """The value pools of one generator, shared by all fields with the same method and args."""
+
+    def __init__(self, size: int, rng):
+        if not isinstance(size, int) or size < 0:
+            raise ValueError(f"faker_pool_size must be a positive integer or 0: {size}")
+        self.size = size
+        self.rng = rng
+        self._pools = {}
+
+    def clear(self):
+        """Drop the values made so far, so every pool makes a new batch."""
+        for pool in self._pools.values():
+            pool.clear()
+
+    def get(self, entry: dict, fill) -> ValuePool:
+        """Return the pool for a keyword_matching entry, made with fill() if it is new."""
+        key = (entry.get("method"), json.dumps(entry.get("args", {}), sort_keys=True, default=str))
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = self._pools[key] = ValuePool(fill, self.size, self.rng)
+        return pool
@@ -6,24 +6,31 @@ import os
 import sys
 import json
 import logging
-import tkinter as tk
-import pyperclip
 
 logger = logging.getLogger(__name__)
 
+# Documents loaded for a $ref, by absolute path, with the mtime they were read at
+_document_cache = {}
+
 
 class InputLoadError(Exception):
     """Raised when schema/config input cannot be loaded or parsed."""
 
 
-def load_schema(schema_source: str | None = None) -> dict:
+def load_schema(schema_source: str | None = None, prepared=None) -> dict:
+    """
+    Load the schema from a file or the clipboard. With prepared, a cache.PreparedSchema,
+    the schema prepared by an earlier run of the same text is used when there is one.
+    """
     logger.debug("Loading schema")
 
     source_label = schema_source or "clipboard"
 
     try:
         raw = _read_input(schema_source)
-        data = _parse_json(raw, source_label)
+        data = prepared.load(raw) if prepared else None
+        if data is None:
+            data = _parse_json(raw, source_label)
         _ensure_dict(data, source_label)
         return data
 
@@ -49,6 +56,29 @@ def load_config(config_file_path: str | None = None) -> dict:
         sys.exit(1)
 
 
+def load_document(path: str) -> dict:
+    """
+    Load a JSON document referenced by a schema. Each file is parsed once and reused until
+    its mtime changes, so files shared by many schemas are only read once.
+    Raises InputLoadError, as a bad reference is reported by the schema that uses it.
+    """
+    path = os.path.abspath(path)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        raise InputLoadError(f"File not found: {path}")
+
+    cached = _document_cache.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    logger.debug("Loading referenced document %s", path)
+    data = _parse_json(_read_file(path), path)
+    _ensure_dict(data, path)
+    _document_cache[path] = (mtime, data)
+    return data
+
+
 def _read_input(source: str | None = None) -> str:
     if source:
         return _read_file(source)
@@ -70,11 +100,16 @@ def _read_file(path: str) -> str:
 
 def _read_clipboard() -> str:
     """Retrieve clipboard text with fallback strategies"""
+    # Imported here, as they are slow to load and only needed without a schema file
+    import pyperclip
+
     try:
         pyperclip.set_clipboard("windows")
         return pyperclip.paste()
     except Exception:
         try:
+            import tkinter as tk
+
             root = tk.Tk()
             root.withdraw()
             return root.clipboard_get()
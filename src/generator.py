@@ -2,31 +2,129 @@
 Functions for generating data based on a JSON schema
 """
 
+import hashlib
 import random
 import logging
 from datetime import date, datetime, timedelta
 import math
-import rstr
-import isodate
+import os
+from functools import partial
+from urllib.parse import unquote
+from src.faker_pool import FakerPools
+from src.unique import DEFAULT_EXACT_LIMIT, UNIQUE_MAX_ATTEMPTS, UniqueField, UniqueRun
+from src.file_loader import InputLoadError, load_document
+from src.keywords import KeywordMatcher
+from src.patterns import get_pattern_sampler
+from src.references import FOREIGN_KEY, parse_foreign_key
+from src import vectorized
+from src.plan import (
+    AllOfNode,
+    ArrayNode,
+    BooleanNode,
+    ChoiceNode,
+    ConstNode,
+    DefaultNode,
+    EnumNode,
+    FallbackNode,
+    KeywordNode,
+    LocaleRecordNode,
+    MultipleOfNode,
+    NumberNode,
+    ObjectNode,
+    PooledNode,
+    RaiseNode,
+    RecursionGuard,
+    RefNode,
+    StringNode,
+    TypedObjectNode,
+    UniqueNode,
+    VectorArrayNode,
+)
 
 logger = logging.getLogger(__name__)
 
 DEFAULT_MAX_ARRAY_LENGTH = 10
+DEFAULT_MAX_REF_DEPTH = 3
+
+# Keywords holding the definitions that a $ref in the same schema points to
+SCHEMA_DEFINITIONS = ("definitions", "$defs")
+
+
+class SchemaRefError(ValueError):
+    """A $ref that can not be resolved."""
+
+
+def record_seed(seed: int, index: int) -> int:
+    """
+    Return the seed of a record from the run seed and the record index, so every record
+    can be made on its own. The first record uses the run seed itself.
+    """
+    if index == 0:
+        return seed
+    digest = hashlib.blake2b(f"{seed}:{index}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
 
 
 class SchemaGenerator:
-    def __init__(self, config, faker_instance):
+    """
+    Compiles schemas into plans and holds the state they generate with. A generator owns
+    its random.Random, seeded with seed, and should be given a Faker that no other
+    generator uses at the same time, so generators can run side by side, in threads too,
+    and each gives the same output for the same seed.
+    """
+
+    def __init__(self, config, faker_instance, seed=None, profiler=None):
         self.config = config
         self.faker = faker_instance
-
-        # Type dispatch map
-        self.type_handlers = {
-            "string": self._generate_string,
-            "integer": self._generate_number,
-            "number": self._generate_number,
-            "boolean": self._generate_boolean,
-            "array": self._generate_array,
-            "object": self._generate_object,
+        self.rng = random.Random(seed)
+
+        # With a profiler, plans are compiled with nodes that count time by JSON path
+        self.profiler = profiler
+        if profiler:
+            self.faker = profiler.wrap_faker(faker_instance)
+
+        self.keyword_matcher = KeywordMatcher(config.get("keyword_matching", []))
+        self.max_ref_depth = config.get("max_ref_depth", DEFAULT_MAX_REF_DEPTH)
+
+        # Arrays of simple items are drawn with NumPy when vectorized_arrays is set
+        self.vectorized_arrays = config.get("vectorized_arrays", False)
+        if self.vectorized_arrays and not vectorized.is_available():
+            logger.debug("NumPy is not installed, vectorized_arrays is ignored")
+            self.vectorized_arrays = False
+        self._numpy_rng = None
+
+        # Keyword matched Faker values are served from pools when faker_pool_size is set
+        pool_size = config.get("faker_pool_size", 0)
+        if self._per_record_locale():
+            # A batch made in one record's locale would be served to the records after it
+            pool_size = 0
+        self.faker_pools = FakerPools(pool_size, self.rng) if pool_size else None
+
+        # Fields unique across the records of a run, marked in the config or with x-unique
+        self.unique_field_names = set(config.get("unique_fields", []))
+        self.unique_exact_limit = config.get("unique_exact_limit", DEFAULT_EXACT_LIMIT)
+        self.unique_fields = []
+        self.unique_values = []
+        # The run that takes unique values as they are made, the record being made and the
+        # error of a value that could not be made unique in it
+        self.unique_run = None
+        self._unique_record = None
+        self._unique_error = None
+
+        # The KeyIndex of every "schema.field" that foreign keys can refer to, see batch
+        self.foreign_keys = {}
+
+        # The disk cache entry of the schema, saved after compiling, see src/cache.py
+        self.prepared_schema = None
+
+        # Type dispatch map, used when compiling a schema into plan nodes
+        self.type_compilers = {
+            "string": self._compile_string,
+            "integer": self._compile_number,
+            "number": self._compile_number,
+            "boolean": self._compile_boolean,
+            "array": self._compile_array,
+            "object": self._compile_object,
         }
 
         # Format handlers for strings
@@ -46,69 +144,366 @@ class SchemaGenerator:
 
     def prepare_schema(self, schema):
         """
-        Resolve all $ref in the schema recursively before generation.
+        Prepare a loaded schema for compiling. A $ref is not expanded here, it is
+        resolved while compiling, once per target.
         """
-        return self.resolve_all_refs(schema)
+        return schema
+
+    def compile(self, schema, args, schema_path=None):
+        """
+        Compile a prepared schema into a tree of plan nodes for the given CLI options.
+        Run the returned plan with plan.generate(), once per record.
+        A $ref to another file is relative to schema_path, or to the working directory.
+        """
+        self.check_start(getattr(args, "start", 0))
+
+        self._ref_targets = {}
+        self._ref_nodes = {}
+        self._ref_guards = {}
+        self._ref_stack = []
+        self._profile_path = ["$"]
+        self.unique_fields = []
+        prepared = self.prepared_schema
+        if prepared:
+            self.keyword_matcher.add_matches(prepared.keyword_matches)
+
+        # The root is compiled like a $ref to "#", so refs back to it make the plan recursive
+        document = (os.path.abspath(schema_path) if schema_path else None, schema)
+        self._root_path = document[0]
+        key, root, self._document = self._dereference(schema, document)
+        key = key or (document[0], "")
+
+        back_refs = []
+        self._ref_stack.append((key, back_refs))
+        try:
+            plan = ObjectNode(
+                self._compile_properties(root, args, path=[]), root.get("required", [])
+            )
+        finally:
+            self._ref_stack.pop()
+        for back_ref in back_refs:
+            back_ref.target = plan
+        if prepared and not prepared.loaded:
+            used = self._used_schema(schema, document[0])
+            if used is not None:
+                prepared.save(used, self.keyword_matcher.matches())
+        if self.profiler:
+            plan = self.profiler.wrap(plan, "$")
+        if self._per_record_locale():
+            plan = LocaleRecordNode(self, plan)
+        self.check_start(getattr(args, "start", 0))
+        return plan
+
+    def check_start(self, start):
+        """Raise ValueError when the last compiled plan can not make records from start on."""
+        if start and self.faker_pools:
+            # A pool serves values made for the records before, so records must be made in order
+            raise ValueError("--start can not be used with faker_pool_size")
+        if start and self.unique_fields:
+            # The records before start could hold the values a record is checked against
+            raise ValueError("--start can not be used with unique fields")
 
     def generate(self, schema, args):
-        return self._generate_from_schema(schema, args, root_schema=schema, path=[])
+        return self.compile(schema, args).generate()
+
+    def referenced_files(self) -> set[str]:
+        """Return the other files the last compiled plan took a $ref target from."""
+        return {
+            doc_path
+            for doc_path, _ in self._ref_targets
+            if doc_path is not None and doc_path != self._root_path
+        }
 
-    def _generate_from_schema(self, schema, args, root_schema, path):
-        result = {}
-        properties = schema.get("properties", {})
+    def _used_schema(self, schema, schema_path):
+        """
+        Return the schema without the definitions its last plan was not compiled from, or
+        None when the plan used another file, which could refer to other definitions later.
+        """
+        used_names = {}
+        for ref_path, pointer in self._ref_targets:
+            if ref_path != schema_path:
+                return None
+            parts = [part.replace("~1", "/").replace("~0", "~") for part in pointer.split("/")]
+            if len(parts) > 1 and parts[1] in SCHEMA_DEFINITIONS:
+                names = used_names.setdefault(parts[1], set())
+                # A $ref to the whole container keeps all of it
+                if names is not None:
+                    used_names[parts[1]] = names | {parts[2]} if len(parts) > 2 else None
+
+        used = dict(schema)
+        for container in SCHEMA_DEFINITIONS:
+            definitions = schema.get(container)
+            names = used_names.get(container, set())
+            if isinstance(definitions, dict) and names is not None:
+                used[container] = {
+                    name: value for name, value in definitions.items() if name in names
+                }
+        return used
+
+    def records(self, plan, seed, count, start=0):
+        """Generate records start to start + count - 1 of the run with seed from a plan."""
+        if not self.unique_fields:
+            for index in range(start, start + count):
+                self.seed_record(seed, index)
+                yield plan.generate()
+            return
+
+        run = UniqueRun(self.unique_fields, count, self.unique_exact_limit)
+        for index in range(start, start + count):
+            yield self.checked_record(run, plan, seed, index)
+
+    def unchecked_records(self, plan, seed, count, start=0):
+        """
+        Generate (record, unique values) pairs like records, without checking the values.
+        The values are checked in record order with UniqueRun.accept, see sharding.
+        """
+        for index in range(start, start + count):
+            self.seed_record(seed, index)
+            self.unique_values = []
+            yield plan.generate(), self.unique_values
+
+    def checked_record(self, run, plan, seed, index):
+        """Generate a record with its unique values taken from run as they are made."""
+        self.seed_record(seed, index)
+        self.unique_run = run
+        # The record and the seeds its values were made again with so far
+        self._unique_record = [seed, index, 0]
+        self._unique_error = None
+        try:
+            record = plan.generate()
+        finally:
+            self.unique_run = None
+        # Raised here, as the fallback of an array or object holding the field would catch it
+        if self._unique_error:
+            raise self._unique_error
+        return record
+
+    def remake_value(self, node, field, value):
+        """
+        Make the value of a unique field again after it repeated a value taken before. An
+        integer range takes its next value that is not taken, other fields are made again
+        with the next seeds of the record until the value is new.
+        """
+        run = self.unique_run
+        next_value = run.take_next(field, value)
+        if next_value is not None:
+            return next_value
+
+        seed, index, attempt = self._unique_record
+        for attempt in range(attempt + 1, attempt + UNIQUE_MAX_ATTEMPTS):
+            self.seed_record(seed, index, attempt)
+            self._unique_record[2] = attempt
+            value = node.generate()
+            if run.take(field, value):
+                return value
+        self._unique_error = self._unique_error or run.error(index, field)
+        return value
 
-        for prop_name, prop_schema in properties.items():
-            if prop_name not in schema.get("required", []) and not args.include_optional:
-                continue
+    def document(self, plan, seed, index):
+        """
+        Prepare the record at index for output.write_document and return the plan to write.
+        A record with unique fields is made whole first, to check its values.
+        """
+        if self.unique_fields:
+            return ConstNode(next(self.records(plan, seed, 1, index)))
+        self.seed_record(seed, index)
+        return plan
+
+    def seed_record(self, seed, index, attempt=0):
+        """
+        Seed the generator and its Faker for a record of the run with seed. The record is then
+        the same as in a full run, whatever was generated before it. A record made again
+        for its unique fields is seeded by the attempt as well.
+        """
+        record = record_seed(record_seed(seed, index), attempt)
+        self.rng.seed(record)
+        self.faker.seed_instance(record)
+        if self._numpy_rng is not None:
+            vectorized.reseed(self._numpy_rng, self.rng.getrandbits(64))
 
-            result[prop_name] = self._generate_value(
-                prop_schema, args, prop_name, root_schema, path + [prop_name]
+    def reset(self, seed):
+        """
+        Reseed the generator and forget the state kept between records, such as pooled
+        values and the NumPy RNG. A compiled plan then gives the same records as a new
+        compile with a generator made with this seed.
+        """
+        self.rng.seed(seed)
+        if self.faker_pools:
+            self.faker_pools.clear()
+        if self._numpy_rng is not None:
+            vectorized.reseed(self._numpy_rng, self.rng.getrandbits(64))
+
+    def _per_record_locale(self):
+        return getattr(self.faker, "per_record", False)
+
+    def _compile_properties(self, schema, args, path):
+        properties = schema.get("properties", {})
+        required = schema.get("required", [])
+
+        return tuple(
+            (
+                prop_name,
+                self._compile_unique(
+                    prop_schema,
+                    args,
+                    path + [prop_name],
+                    self._compile_profiled(
+                        prop_schema, args, prop_name, path + [prop_name], "." + prop_name
+                    ),
+                ),
             )
+            for prop_name, prop_schema in properties.items()
+            if prop_name in required or args.include_optional
+        )
 
-        return result
+    def _compile_unique(self, schema, args, path, node):
+        """Wrap a property that is unique across records, so its values are reported."""
+        if args.blank or not (
+            path[-1] in self.unique_field_names
+            or (isinstance(schema, dict) and schema.get("x-unique") is True)
+        ):
+            return node
+
+        self.unique_fields.append(UniqueField(".".join(path), node.distinct_values()))
+        return UniqueNode(self, node, len(self.unique_fields) - 1)
+
+    def _compile_profiled(self, schema, args, field_name, path, step):
+        """Compile a property or array item, counted by its JSON path when profiling."""
+        if not self.profiler:
+            return self._compile_value(schema, args, field_name, path)
+
+        self._profile_path.append(step)
+        try:
+            node = self._compile_value(schema, args, field_name, path)
+            # A recursive $ref stays a RefNode, arrays check for it to stop the recursion
+            if isinstance(node, RefNode):
+                return node
+            return self.profiler.wrap(node, "".join(self._profile_path))
+        finally:
+            self._profile_path.pop()
+
+    def _compile_value(self, schema, args, field_name, path):
+        # Errors are raised when the value is generated, as the interpreter used to
+        try:
+            return self._compile_untyped(schema, args, field_name, path)
+        except SchemaRefError:
+            raise
+        except Exception as e:
+            return RaiseNode(e)
+
+    def _compile_untyped(self, schema, args, field_name, path):
+        if FOREIGN_KEY in schema and not args.blank:
+            node = self._compile_foreign_key(schema[FOREIGN_KEY])
+            if node:
+                return node
+
+        if "$ref" in schema:
+            return self._compile_ref(schema["$ref"], args, field_name, path)
 
-    def _generate_value(self, schema, args, field_name, root_schema, path):
         if "enum" in schema:
-            return self._handle_enum(schema, args.blank)
+            return self._compile_enum(schema, args.blank)
 
         # Handle combinators
         for key in ("oneOf", "anyOf"):
             if key in schema:
-                return self._generate_value(
-                    random.choice(schema[key]), args, field_name, root_schema, path
+                return ChoiceNode(
+                    tuple(
+                        self._compile_value(sub_schema, args, field_name, path)
+                        for sub_schema in schema[key]
+                    ),
+                    self.rng,
                 )
 
         if "allOf" in schema:
-            merged = {}
-            for sub_schema in schema["allOf"]:
-                val = self._generate_value(sub_schema, args, field_name, root_schema, path)
-                if isinstance(val, dict):
-                    merged.update(val)
-            return merged
+            return AllOfNode(
+                tuple(
+                    self._compile_value(sub_schema, args, field_name, path)
+                    for sub_schema in schema["allOf"]
+                )
+            )
 
         schema_type = schema.get("type")
         if not schema_type and args.keymatch:
-            return self._generate_from_keywords(schema, field_name, args.blank, path)
+            return self._compile_keywords(schema, field_name, args.blank, path)
 
-        handler = self.type_handlers.get(schema_type)
-        if handler:
+        compiler = self.type_compilers.get(schema_type)
+        if compiler:
             try:
-                return handler(schema, args, field_name, root_schema, path)
+                return compiler(schema, args, field_name, path)
+            except SchemaRefError:
+                raise
             except Exception as e:
-                logger.warning('Field "%s" fallback for type "%s": %s', field_name, schema_type, e)
-                return self._default_value(schema_type)
-
-        return None
-
-    def _generate_object(self, schema, args, field_name, root_schema, path):
-        return self._generate_from_schema(schema, args, root_schema, path)
+                return FallbackNode(self, field_name, schema_type, e)
+
+        return ConstNode(None)
+
+    def _compile_foreign_key(self, foreign_key):
+        parse_foreign_key(foreign_key)
+        index = self.foreign_keys.get(foreign_key)
+        if index is None:
+            # Without the other schema in the run the value comes from the rest of the schema
+            logger.debug("No keys for %s in this run, generating it from its schema", foreign_key)
+            return None
+        if not index.keys:
+            raise ValueError(f"No keys were generated for {foreign_key}")
+        # The keys are complete, as the other schema is generated first
+        return EnumNode(index.keys, self.rng)
+
+    def _compile_ref(self, ref, args, field_name, path):
+        """
+        Compile the target of a $ref once and share the node between every place that uses
+        it with the same field name and keyword path signature. A $ref back to a target that
+        is still being compiled gives a RefNode, limited to max_ref_depth levels.
+        """
+        key, target, document = self._resolve_ref(ref, self._document)
+
+        for pending_key, back_refs in reversed(self._ref_stack):
+            if pending_key == key:
+                guard = self._ref_guards.get(key)
+                if guard is None:
+                    guard = self._ref_guards[key] = RecursionGuard(self.max_ref_depth)
+                node = RefNode(guard)
+                back_refs.append(node)
+                return node
+
+        # When profiling every use is compiled on its own, to count it by its own path
+        node_key = (key, field_name, self.keyword_matcher.path_signature(path))
+        node = self._ref_nodes.get(node_key)
+        if node is not None and not self.profiler:
+            return node
+
+        # Refs inside the target are relative to the document it was found in
+        back_refs = []
+        outer_document, self._document = self._document, document
+        self._ref_stack.append((key, back_refs))
+        try:
+            node = self._compile_value(target, args, field_name, path)
+        finally:
+            self._ref_stack.pop()
+            self._document = outer_document
+        for back_ref in back_refs:
+            back_ref.target = node
+
+        self._ref_nodes[node_key] = node
+        return node
+
+    def _compile_object(self, schema, args, field_name, path):
+        return TypedObjectNode(
+            self,
+            field_name,
+            self._compile_properties(schema, args, path),
+            schema.get("required", []),
+        )
 
-    def _generate_boolean(self, schema, args, field_name, root_schema, path):
-        return False if args.blank else self.faker.boolean()
+    def _compile_boolean(self, schema, args, field_name, path):
+        if args.blank:
+            return ConstNode(False)
+        return BooleanNode(self, field_name, "boolean")
 
-    def _generate_number(self, schema, args, field_name, root_schema=None, path=None):
+    def _compile_number(self, schema, args, field_name, path):
+        schema_type = schema.get("type")
         if args.blank:
-            return 0 if schema.get("type") == "integer" else 0.0
+            return ConstNode(0 if schema_type == "integer" else 0.0)
 
         min_val, max_val = self._compute_numeric_bounds(schema)
         multiple_of = schema.get("multipleOf")
@@ -116,14 +511,11 @@ class SchemaGenerator:
         if multiple_of:
             start = math.ceil(min_val / multiple_of)
             end = math.floor(max_val / multiple_of)
-            value = multiple_of * random.randint(start, max(end, start))
-        else:
-            value = random.uniform(min_val, max_val)
-
-        if schema.get("type") == "integer":
-            value = int(math.floor(value))
+            return MultipleOfNode(
+                self, field_name, schema_type, multiple_of, start, max(end, start)
+            )
 
-        return value
+        return NumberNode(self, field_name, schema_type, min_val, max_val)
 
     def _compute_numeric_bounds(self, schema):
         if "exclusiveMinimum" in schema:
@@ -144,138 +536,127 @@ class SchemaGenerator:
             min_val, max_val = max_val, min_val
         return min_val, max_val
 
-    def _generate_string(self, schema, args, field_name, root_schema=None, path=None):
+    def _compile_string(self, schema, args, field_name, path):
         if args.blank:
-            return ""
+            return ConstNode("")
 
         fmt = schema.get("format")
-        if fmt in self.format_handlers:
-            try:
-                return self.format_handlers[fmt]()
-            except Exception as e:
-                logger.warning("Format handler failed: %s - %s", fmt, e)
+        format_handler = self.format_handlers[fmt] if fmt in self.format_handlers else None
 
         pattern = schema.get("pattern")
-        if pattern:
-            try:
-                return rstr.xeger(pattern)
-            except Exception as e:
-                logger.warning("Pattern generation failed: %s - %s", pattern, e)
-
-        return self._generate_from_keywords(schema, field_name, args.blank, path)
+        pattern_sampler = None
+        if pattern and isinstance(pattern, str):
+            pattern_sampler = get_pattern_sampler(pattern)
+        elif pattern:
+            logger.warning("Pattern generation failed: %s - pattern must be a string", pattern)
+
+        return StringNode(
+            self,
+            field_name,
+            fmt,
+            format_handler,
+            pattern_sampler,
+            self._compile_keywords(schema, field_name, args.blank, path),
+        )
 
     def _generate_duration_iso(self):
+        import isodate
+
         duration = timedelta(
-            days=random.randint(0, 30),
-            hours=random.randint(0, 23),
-            minutes=random.randint(0, 59),
-            seconds=random.randint(0, 59),
+            days=self.rng.randint(0, 30),
+            hours=self.rng.randint(0, 23),
+            minutes=self.rng.randint(0, 59),
+            seconds=self.rng.randint(0, 59),
         )
         return isodate.duration_isoformat(duration)
 
-    def _generate_array(self, schema, args, field_name, root_schema, path):
+    def _compile_array(self, schema, args, field_name, path):
         min_items = schema.get("minItems", 0 if args.blank else 1)
         max_items = schema.get(
             "maxItems", self.config.get("max_array_length", DEFAULT_MAX_ARRAY_LENGTH)
         )
-        length = 0 if args.blank else random.randint(min_items, max_items)
 
         items_schema = schema.get("items", {})
         additional_items = schema.get("additionalItems", True)
         unique_items = schema.get("uniqueItems", False)
 
-        results = []
-
+        items = tuple_items = extra_items = None
         if isinstance(items_schema, list):
-            for idx, item_schema in enumerate(items_schema):
-                if idx < length:
-                    results.append(
-                        self._generate_value(item_schema, args, field_name, root_schema, path)
-                    )
-            if additional_items and length > len(items_schema):
+            tuple_items = tuple(
+                self._compile_profiled(item_schema, args, field_name, path, f"[{index}]")
+                for index, item_schema in enumerate(items_schema)
+            )
+            # An additionalItems $ref to an empty schema gives no extra items, like {} does
+            if self._dereference(additional_items, self._document)[1]:
                 extra_schema = additional_items if isinstance(additional_items, dict) else {}
-                for _ in range(length - len(items_schema)):
-                    results.append(
-                        self._generate_value(extra_schema, args, field_name, root_schema, path)
-                    )
-        else:
-            for _ in range(length):
-                results.append(
-                    self._generate_value(items_schema, args, field_name, root_schema, path)
+                extra_items = self._compile_profiled(extra_schema, args, field_name, path, "[]")
+
+        # Unique arrays regenerate from the items schema, even when it is a list
+        if tuple_items is None or unique_items:
+            items = self._compile_profiled(items_schema, args, field_name, path, "[]")
+
+        # Items with few enough values are sampled without replacement, which also shows
+        # here when there are not enough of them for minItems
+        distinct = None
+        if unique_items and tuple_items is None and not args.blank:
+            distinct = items.distinct_values()
+            if distinct is not None and len(distinct) < min_items:
+                raise ValueError(
+                    f"uniqueItems needs {min_items} items, but the items schema has only "
+                    f"{len(distinct)} different values"
                 )
 
-        if unique_items:
-            results = self._ensure_unique(
-                results,
-                min_items,
-                lambda: self._generate_value(items_schema, args, field_name, root_schema, path),
+        if (
+            self.vectorized_arrays
+            and tuple_items is None
+            and not args.blank
+            and isinstance(max_items, int)
+            and max_items >= vectorized.VECTOR_MIN_LENGTH
+        ):
+            draw = self._compile_vector_draw(items_schema)
+            if draw:
+                return VectorArrayNode(
+                    self, field_name, min_items, max_items, draw, items, unique_items, distinct
+                )
+
+        return ArrayNode(
+            self,
+            field_name,
+            args.blank,
+            min_items,
+            max_items,
+            items,
+            tuple_items,
+            extra_items,
+            unique_items,
+            distinct,
+        )
+
+    def _compile_vector_draw(self, items_schema):
+        if self._numpy_rng is None:
+            self._numpy_rng = vectorized.make_rng(self.rng.getrandbits(64))
+        try:
+            items_schema = self._dereference(items_schema, self._document)[1]
+            return vectorized.compile_draw(
+                self._numpy_rng, items_schema, self._compute_numeric_bounds
             )
+        except Exception as e:
+            logger.debug("Array items are not vectorized: %s", e)
+            return None
 
-        return results
+    def _compile_keywords(self, schema, field_name, blank_mode, path=None):
+        if blank_mode:
+            return ConstNode("")
 
-    def _ensure_unique(self, items, min_items, generate_func):
-        seen = set()
-        unique_results = []
-
-        for v in items:
-            key = repr(v)
-            if key not in seen:
-                seen.add(key)
-                unique_results.append(v)
-
-        while len(unique_results) < min_items:
-            candidate = generate_func()
-            key = repr(candidate)
-            if key not in seen:
-                seen.add(key)
-                unique_results.append(candidate)
-
-        return unique_results
-
-    def _generate_from_keywords(self, schema, field_name, blank_mode, path=None):
-        text = f"{schema.get('description', '')} {schema.get('title', '')} {field_name}".strip()
-        keyword_map = self.config.get("keyword_matching", [])
-        field_name_lower = (field_name or "").lower()
-        full_text = text.lower()
-
-        def matches(entry):
-            for kw in entry.get("keywords", []):
-                if isinstance(kw, str) and kw.lower() in field_name_lower:
-                    return True
-                if isinstance(kw, dict) and self._matches_nested_pattern(kw, path or []):
-                    return True
-            return False
-
-        for entry in keyword_map:
-            if matches(entry):
-                return self._faker_from_entry(entry, blank_mode, "string")
-
-        if any(
-            isinstance(k, str) and k.lower() in full_text
-            for entry in keyword_map
-            for k in entry.get("keywords", [])
-        ):
-            return self._faker_from_entry(entry, blank_mode, "string")
-
-        return "" if blank_mode else self._default_value("string")
-
-    def _matches_nested_pattern(self, pattern, path):
-        if not isinstance(pattern, dict) or not path:
-            return False
-
-        for parent, child in pattern.items():
-            parent = parent.lower()
-            if isinstance(child, dict):
-                for i in range(len(path) - 1):
-                    if path[i].lower() == parent and self._matches_nested_pattern(
-                        child, path[i + 1 :]
-                    ):
-                        return True
-            elif isinstance(child, str):
-                for i in range(len(path) - 1):
-                    if path[i].lower() == parent and path[i + 1].lower() == child.lower():
-                        return True
-        return False
+        entry = self.keyword_matcher.match(
+            field_name, path, schema.get("description", ""), schema.get("title", "")
+        )
+        if entry is None:
+            return DefaultNode(self, "string")
+        if self.faker_pools and entry.get("method") not in (None, "override"):
+            fill = partial(self._faker_from_entry, entry, False, "string")
+            return PooledNode(self.faker_pools.get(entry, fill))
+        return KeywordNode(self, entry)
 
     def _faker_from_entry(self, entry, blank_mode, expected_type):
         if blank_mode:
@@ -304,11 +685,11 @@ class SchemaGenerator:
             return float(value) if isinstance(value, (int, float, str)) else 0.0
         return value
 
-    def _handle_enum(self, schema, blank_mode):
+    def _compile_enum(self, schema, blank_mode):
         enum_values = schema.get("enum", [])
         if not enum_values:
-            return self._default_value(schema.get("type")) if blank_mode else None
-        return enum_values[0] if blank_mode else random.choice(enum_values)
+            return DefaultNode(self, schema.get("type")) if blank_mode else ConstNode(None)
+        return ConstNode(enum_values[0]) if blank_mode else EnumNode(enum_values, self.rng)
 
     def _default_value(self, expected_type):
         if expected_type == "string":
@@ -321,28 +702,63 @@ class SchemaGenerator:
             return self.faker.boolean()
         return self.faker.word()
 
-    def _resolve_ref(self, ref_path, root_schema):
-        if not ref_path.startswith("#/"):
-            raise ValueError("Unsupported $ref format")
-        current = root_schema
-        for part in ref_path.lstrip("#/").split("/"):
-            if not isinstance(current, dict):
-                raise ValueError("Invalid $ref path")
-            current = current.get(part)
-            if current is None:
-                raise ValueError("Unresolvable $ref path")
-        return current
+    def _dereference(self, schema, document):
+        """
+        Follow $ref until a schema without one, for checks made before compiling.
+        Returns the key of the last ref followed, the schema and the document it is in.
+        """
+        key = None
+        seen = set()
+        while isinstance(schema, dict) and "$ref" in schema:
+            key, schema, document = self._resolve_ref(schema["$ref"], document)
+            if key in seen:
+                raise SchemaRefError(f"Circular $ref: {key[1] or '#'}")
+            seen.add(key)
+        return key, schema, document
+
+    def _resolve_ref(self, ref, document):
+        """
+        Resolve a $ref such as "#/definitions/address" or "common.json#/definitions/address"
+        from the document (path, root schema) it is in. Other files are loaded through
+        file_loader, relative to the document. Returns (key, target schema, target document),
+        where the key is the absolute file path and the JSON pointer.
+        """
+        if not isinstance(ref, str) or "://" in ref:
+            raise SchemaRefError(f"Unsupported $ref format: {ref}")
 
-    def resolve_all_refs(self, schema, root_schema=None):
-        root_schema = root_schema or schema
+        file_part, _, pointer = ref.partition("#")
+        pointer = unquote(pointer)
+        doc_path, root = document
+        if file_part:
+            base_dir = os.path.dirname(doc_path) if doc_path else os.getcwd()
+            doc_path = os.path.normpath(os.path.join(base_dir, unquote(file_part)))
+        key = (doc_path, pointer)
 
-        if isinstance(schema, dict):
-            if "$ref" in schema:
-                resolved = self._resolve_ref(schema["$ref"], root_schema)
-                return self.resolve_all_refs(resolved, root_schema)
-            return {k: self.resolve_all_refs(v, root_schema) for k, v in schema.items()}
+        if key in self._ref_targets:
+            return self._ref_targets[key]
 
-        if isinstance(schema, list):
-            return [self.resolve_all_refs(item, root_schema) for item in schema]
+        if file_part:
+            try:
+                root = load_document(doc_path)
+            except InputLoadError as err:
+                raise SchemaRefError(f"Unable to load $ref {ref}: {err}") from err
+        if pointer and not pointer.startswith("/"):
+            raise SchemaRefError(f"Unsupported $ref format: {ref}")
+
+        current = root
+        for part in pointer.split("/")[1:]:
+            part = part.replace("~1", "/").replace("~0", "~")
+            if isinstance(current, dict):
+                current = current.get(part)
+            elif isinstance(current, list) and part.isdigit() and int(part) < len(current):
+                current = current[int(part)]
+            else:
+                raise SchemaRefError(f"Invalid $ref path: {ref}")
+            if current is None:
+                raise SchemaRefError(f"Unresolvable $ref path: {ref}")
 
-        return schema
+        if not isinstance(current, dict):
+            raise SchemaRefError(f"$ref must point to a schema object: {ref}")
+
+        resolved = self._ref_targets[key] = (key, current, (doc_path, root))
+        return resolved
@@ -0,0 +1,153 @@
+"""
+Matching of schema fields against the keyword_matching config
+"""
+
+import json
+import re
+from functools import lru_cache
+
+# keyword_matching configs whose compiled keywords are kept, a run usually has one
+KEYWORD_CACHE_SIZE = 16
+
+
+class KeywordMatcher:
+    """
+    Finds the keyword_matching entry for a field.
+    The keywords are compiled once per config and shared by all matchers of that config,
+    such as the generators of a batch or the server. Each matcher remembers the result for
+    each distinct field (path, name, description and title) it was asked about.
+    """
+
+    def __init__(self, keyword_map: list):
+        (
+            self.entries,
+            self.path_patterns,
+            self._path_segments,
+            self._keyword_index,
+            self._name_regex,
+            self._text_regex,
+        ) = _compile_keywords(json.dumps(keyword_map, ensure_ascii=False, default=str))
+        self._cache = {}
+
+    def match(self, field_name, path=None, description="", title=""):
+        """Return the matching entry for a field, or None if no keyword matches."""
+        text = f"{description} {title} {field_name}".strip()
+        key = (tuple(path or ()), field_name, text)
+        if key not in self._cache:
+            self._cache[key] = self._find(field_name, path or [], text)
+        index = self._cache[key]
+        return None if index is None else self.entries[index]
+
+    def matches(self) -> dict:
+        """Return the remembered results, to be given to add_matches of a later matcher."""
+        return dict(self._cache)
+
+    def add_matches(self, matches: dict):
+        """Remember results returned by matches of a matcher with the same config."""
+        self._cache.update(matches)
+
+    def path_signature(self, path):
+        """
+        Reduce a path to the parts that nested path keywords can match on. Fields with the
+        same name and signature get the same match. Segments that are not in any pattern
+        only matter as gaps, so each run of them becomes a single None.
+        """
+        signature = []
+        for segment in path or ():
+            segment = segment.lower()
+            if segment in self._path_segments:
+                signature.append(segment)
+            elif not signature or signature[-1] is not None:
+                signature.append(None)
+        return tuple(signature)
+
+    def _find(self, field_name, path, text):
+        best = self._match_name((field_name or "").lower())
+        best = self._match_path([segment.lower() for segment in path], best)
+        if best is not None:
+            return best
+
+        # Keywords found in the description or title give the last entry
+        if self._text_regex and self._text_regex.search(text.lower()):
+            return len(self.entries) - 1
+
+        return None
+
+    def _match_name(self, field_name_lower):
+        if not self._name_regex:
+            return None
+        best = None
+        for found in self._name_regex.finditer(field_name_lower):
+            index = self._keyword_index[found.group(1)]
+            if best is None or index < best:
+                best = index
+                if best == 0:
+                    break
+        return best
+
+    def _match_path(self, path, best):
+        if len(path) < 2:
+            return best
+        for index, sequence in self.path_patterns:
+            if best is not None and index >= best:
+                break
+            if _path_matches(sequence, path):
+                return index
+        return best
+
+
+@lru_cache(maxsize=KEYWORD_CACHE_SIZE)
+def _compile_keywords(keyword_text: str) -> tuple:
+    """Compile a keyword_matching config, given as JSON text so it can be the cache key."""
+    entries = json.loads(keyword_text)
+    name_keywords = {}
+    path_patterns = []
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            raise ValueError(f"keyword_matching entry {index} must be an object: {entry}")
+        for keyword in entry.get("keywords", []):
+            if isinstance(keyword, str):
+                name_keywords.setdefault(keyword.lower(), index)
+            elif isinstance(keyword, dict):
+                path_patterns.extend(
+                    (index, sequence) for sequence in _flatten_path_pattern(keyword)
+                )
+
+    path_segments = {segment for _, sequence in path_patterns for segment in sequence}
+
+    # Alternatives are ordered by entry, so at every position the lookahead reports the
+    # earliest entry with a keyword starting there
+    alternatives = "|".join(re.escape(keyword) for keyword in name_keywords)
+    name_regex = re.compile(f"(?=({alternatives}))") if name_keywords else None
+    text_regex = re.compile(alternatives) if name_keywords else None
+    return entries, path_patterns, path_segments, name_keywords, name_regex, text_regex
+
+
+def _flatten_path_pattern(pattern: dict):
+    """Turn {"parent": {"child": "key"}} into sequences like ("parent", "child", "key")."""
+    sequences = []
+    for parent, child in pattern.items():
+        if isinstance(child, str):
+            sequences.append((parent.lower(), child.lower()))
+        elif isinstance(child, dict):
+            sequences.extend((parent.lower(),) + rest for rest in _flatten_path_pattern(child))
+    return sequences
+
+
+def _path_matches(sequence, path):
+    """
+    The leading segments of a sequence must appear in order along the path, and the last
+    two must be next to each other after them.
+    """
+    position = 0
+    for segment in sequence[:-2]:
+        try:
+            position = path.index(segment, position, len(path) - 1) + 1
+        except ValueError:
+            return False
+
+    parent, child = sequence[-2:]
+    for i in range(position, len(path) - 1):
+        if path[i] == parent and path[i + 1] == child:
+            return True
+    return False
@@ -0,0 +1,179 @@
+"""
+Functions for writing generated records to the console, files and the clipboard
+"""
+
+import json
+import math
+import textwrap
+from json.encoder import encode_basestring
+from src.compression import compression_for_path, open_compressed
+from src.tabular import DELIMITERS, TABLE_FORMATS, record_chunks, serialize_rows, table_header
+
+WRITE_BUFFER_SIZE = 1 << 20
+
+OUTPUT_FORMATS = ("json", "ndjson") + TABLE_FORMATS
+
+
+class OutputStream:
+    """Collects written text and passes it on to every target in large chunks."""
+
+    def __init__(self, targets, buffer_size: int = WRITE_BUFFER_SIZE):
+        self.targets = targets
+        self.buffer_size = buffer_size
+        self._chunks = []
+        self._size = 0
+
+    def write(self, text: str):
+        self._chunks.append(text)
+        self._size += len(text)
+        if self._size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if not self._chunks:
+            return
+        data = "".join(self._chunks)
+        self._chunks.clear()
+        self._size = 0
+        for target in self.targets:
+            target.write(data)
+
+    def close(self):
+        self.flush()
+        for target in self.targets:
+            target.flush()
+
+
+class JsonStyle:
+    """
+    The layout used when a plan writes its value as JSON. Pretty output is the same as
+    json.dumps(value, indent=2) and compact output has no whitespace at all.
+    """
+
+    def __init__(self, compact: bool = False):
+        self.compact = compact
+        self._key_separator = ":" if compact else ": "
+        self._newlines = []
+
+    def newline(self, level: int) -> str:
+        if self.compact:
+            return ""
+        while len(self._newlines) <= level:
+            self._newlines.append("\n" + "  " * len(self._newlines))
+        return self._newlines[level]
+
+    def key(self, name: str) -> str:
+        return encode_basestring(name) + self._key_separator
+
+    def encode(self, value, level: int) -> str:
+        """Encode a value that starts at the given nesting level."""
+        if isinstance(value, str):
+            return encode_basestring(value)
+        if value is None:
+            return "null"
+        if value is True:
+            return "true"
+        if value is False:
+            return "false"
+        if type(value) is int:
+            return int.__repr__(value)
+        if type(value) is float and math.isfinite(value):
+            return float.__repr__(value)
+
+        if self.compact:
+            return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+        text = json.dumps(value, ensure_ascii=False, indent=2)
+        return text.replace("\n", self.newline(level)) if level else text
+
+
+def open_output_file(path: str, compression=None, level=None, threaded=False):
+    """
+    Open an output file, compressed as it is written when compression names a codec or the
+    file name ends in its extension, see src/compression.py.
+    """
+    compression = compression or compression_for_path(path)
+    if compression:
+        return open_compressed(path, compression, level, threaded)
+    return open(path, "w", encoding="utf-8", newline="\n", buffering=WRITE_BUFFER_SIZE)
+
+
+def write_document(plan, out: OutputStream, compact: bool = False) -> int:
+    """
+    Generate a single record from a plan and write it as JSON while it is generated,
+    so memory use follows the nesting depth instead of the document size.
+    """
+    plan.write(JsonStyle(compact), out, 0)
+    out.write("\n")
+    return 1
+
+
+def write_records(
+    records, out: OutputStream, output_format: str = "json", compact=False, columns=None
+) -> int:
+    """
+    Write records one at a time as a JSON array or as NDJSON, or in chunks of rows as CSV
+    or TSV with the columns from tabular.table_columns, and return how many were written.
+    """
+    if output_format in DELIMITERS:
+        chunks = (serialize_rows(chunk, columns, output_format) for chunk in record_chunks(records))
+    else:
+        chunks = ((serialize_record(record, output_format, compact), 1) for record in records)
+    return write_chunks(chunks, out, output_format, compact, columns)
+
+
+def serialize_record(record, output_format: str, compact=False, columns=None) -> str:
+    """
+    Serialize a record as an NDJSON line, a CSV or TSV row or as an element of a JSON array,
+    which is indented unless compact is set.
+    """
+    if output_format in DELIMITERS:
+        return serialize_rows([record], columns, output_format)[0]
+    if output_format == "ndjson":
+        return json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+    if compact:
+        return json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+    return textwrap.indent(json.dumps(record, ensure_ascii=False, indent=2), "  ")
+
+
+def serialize_records(records, output_format: str, compact=False, columns=None) -> tuple[str, int]:
+    """Serialize records into one chunk of text for write_chunks, with the record count."""
+    if output_format in DELIMITERS:
+        return serialize_rows(records, columns, output_format)
+    parts = [serialize_record(record, output_format, compact) for record in records]
+    return join_records(parts, output_format, compact)
+
+
+def join_records(parts: list[str], output_format: str, compact=False) -> tuple[str, int]:
+    """Join records serialized by serialize_record into one chunk for write_chunks."""
+    return _separator(output_format, compact).join(parts), len(parts)
+
+
+def write_chunks(
+    chunks, out: OutputStream, output_format: str = "json", compact=False, columns=None
+) -> int:
+    """Write (text, count) chunks of serialized records in order and return the record count."""
+    count = 0
+    if output_format in DELIMITERS:
+        out.write(table_header(columns, output_format))
+    if output_format != "json":
+        for text, chunk_count in chunks:
+            out.write(text)
+            count += chunk_count
+        return count
+
+    newline = "" if compact else "\n"
+    out.write("[")
+    for text, chunk_count in chunks:
+        if not chunk_count:
+            continue
+        out.write(_separator(output_format, compact) if count else newline)
+        out.write(text)
+        count += chunk_count
+    out.write(newline + "]\n" if count else "]\n")
+    return count
+
+
+def _separator(output_format: str, compact: bool) -> str:
+    if output_format != "json":
+        return ""
+    return "," if compact else ",\n"
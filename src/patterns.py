@@ -0,0 +1,168 @@
+"""
+Functions for generating strings that match a regular expression pattern
+
+Patterns are parsed once into a tree of sampling functions and cached, so generating a
+value only walks the tree with the generator's RNG.
+"""
+
+import logging
+import string
+from functools import lru_cache
+
+# The parser of the re module is private. It is re._parser from Python 3.11, and the
+# deprecated sre_parse before. Without either, patterns fall back like unsupported ones.
+try:
+    import re._parser as sre_parse
+except ImportError:
+    try:
+        import sre_parse  # Python < 3.11
+    except ImportError:
+        sre_parse = None
+
+logger = logging.getLogger(__name__)
+
+PATTERN_CACHE_SIZE = 512
+
+# The * and + repeats are capped, the same limit rstr uses. A repeat with a larger minimum,
+# such as {150}, is made exactly that many times.
+STAR_PLUS_LIMIT = 100
+
+PRINTABLE = string.printable
+WORD = string.ascii_letters + string.digits + "_"
+CATEGORIES = {
+    "category_digit": string.digits,
+    "category_not_digit": string.ascii_letters + string.punctuation,
+    "category_space": string.whitespace,
+    "category_not_space": string.printable.strip(),
+    "category_word": WORD,
+    "category_not_word": "".join(sorted(set(PRINTABLE).difference(WORD))),
+}
+
+
+class PatternSampler:
+    """A parsed pattern that builds matching strings from a given RNG."""
+
+    __slots__ = ("pattern", "_build")
+
+    def __init__(self, pattern: str):
+        if sre_parse is None:
+            raise ValueError("this Python has no regular expression parser to sample from")
+        self.pattern = pattern
+        self._build = _compile_sequence(sre_parse.parse(pattern))
+
+    def sample(self, rng) -> str:
+        return self._build(rng, {})
+
+
+@lru_cache(maxsize=PATTERN_CACHE_SIZE)
+def get_pattern_sampler(pattern):
+    """
+    Return the cached sampler for a pattern, or None if the pattern is not supported.
+    The failure is cached as well, so the warning is only logged once per pattern.
+    """
+    try:
+        return PatternSampler(pattern)
+    except Exception as e:
+        logger.warning("Pattern generation failed: %s - %s", pattern, e)
+        return None
+
+
+def _compile_sequence(states):
+    parts = []
+    for opcode, value in states:
+        part = _compile_state(opcode.name.lower(), value)
+        # Join neighbouring literals into one constant string
+        if isinstance(part, str) and parts and isinstance(parts[-1], str):
+            parts[-1] += part
+        else:
+            parts.append(part)
+
+    if not parts:
+        return lambda rng, groups: ""
+    if len(parts) == 1:
+        part = parts[0]
+        if isinstance(part, str):
+            return lambda rng, groups: part
+        return part
+
+    builders = [
+        (lambda rng, groups, text=part: text) if isinstance(part, str) else part for part in parts
+    ]
+    return lambda rng, groups: "".join([build(rng, groups) for build in builders])
+
+
+def _compile_state(opcode, value):
+    """Compile one parsed state into a constant string or a function of (rng, groups)."""
+    if opcode == "literal":
+        return chr(value)
+
+    if opcode in ("at", "assert_not"):
+        return ""
+
+    if opcode == "not_literal":
+        candidates = PRINTABLE.replace(chr(value), "")
+        return lambda rng, groups: rng.choice(candidates)
+
+    if opcode == "any":
+        candidates = PRINTABLE.replace("\n", "")
+        return lambda rng, groups: rng.choice(candidates)
+
+    if opcode == "in":
+        candidates = _class_candidates(value)
+        return lambda rng, groups: rng.choice(candidates)
+
+    if opcode == "category":
+        return CATEGORIES[value.name.lower()]
+
+    if opcode == "branch":
+        branches = [_compile_sequence(branch) for branch in value[1]]
+        return lambda rng, groups: rng.choice(branches)(rng, groups)
+
+    if opcode == "subpattern":
+        group = value[0]
+        build = _compile_sequence(value[-1])
+        if not group:
+            return build
+
+        def build_group(rng, groups):
+            result = groups[group] = build(rng, groups)
+            return result
+
+        return build_group
+
+    if opcode == "assert":
+        return _compile_sequence(value[1])
+
+    if opcode == "groupref":
+        return lambda rng, groups: groups[value]
+
+    if opcode in ("min_repeat", "max_repeat"):
+        start, end, item = value
+        end = max(start, min(end, STAR_PLUS_LIMIT))
+        build = _compile_sequence(item)
+        return lambda rng, groups: "".join(
+            [build(rng, groups) for _ in range(rng.randint(start, end))]
+        )
+
+    raise ValueError(f"unsupported regular expression construct '{opcode}'")
+
+
+def _class_candidates(items):
+    candidates = []
+    negate = False
+    for opcode, value in items:
+        opcode = opcode.name.lower()
+        if opcode == "negate":
+            negate = True
+        elif opcode == "literal":
+            candidates.append(chr(value))
+        elif opcode == "range":
+            candidates.extend(chr(i) for i in range(value[0], value[1] + 1))
+        elif opcode == "category":
+            candidates.extend(CATEGORIES[value.name.lower()])
+        else:
+            raise ValueError(f"unsupported character class item '{opcode}'")
+
+    if negate:
+        return sorted(set(PRINTABLE).difference(candidates))
+    return candidates
@@ -0,0 +1,642 @@
+"""
+Plan nodes produced by SchemaGenerator.compile
+
+Each node holds everything resolved from its part of the schema, so generating a
+value only runs the node instead of interpreting the schema dict again.
+
+A plan can also write its value as JSON while generating it, see PlanNode.write.
+Objects and arrays then write each item as soon as it is made, so a large document
+never has to be held in memory in full.
+"""
+
+from itertools import chain, repeat
+import logging
+import math
+
+logger = logging.getLogger(__name__)
+
+# Duplicates drawn in a row before a unique array stops looking for new items
+UNIQUE_MAX_MISSES = 100
+
+
+class PlanNode:
+    __slots__ = ()
+
+    # Whether generate() can raise. Objects and arrays only stream their items when none
+    # of them can, since a fallback can not replace what is already written.
+    may_raise = False
+
+    def generate(self):
+        raise NotImplementedError
+
+    def write(self, style, out, level):
+        """Write the value as JSON to out, with the layout of an output.JsonStyle."""
+        out.write(style.encode(self.generate(), level))
+
+    def distinct_values(self):
+        """
+        Return a sequence of every value the node can give, each once, or None when they
+        are not known or too many to list. Unique arrays sample from it without replacement.
+        """
+        return None
+
+
+class ConstNode(PlanNode):
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def generate(self):
+        return self.value
+
+    def distinct_values(self):
+        return (self.value,)
+
+
+class RaiseNode(PlanNode):
+    """Re-raises an error found while compiling, at the point the value is generated."""
+
+    __slots__ = ("error",)
+    may_raise = True
+
+    def __init__(self, error):
+        self.error = error
+
+    def generate(self):
+        raise self.error.with_traceback(None)
+
+
+class DefaultNode(PlanNode):
+    __slots__ = ("gen", "expected_type")
+
+    def __init__(self, gen, expected_type):
+        self.gen = gen
+        self.expected_type = expected_type
+
+    def generate(self):
+        return self.gen._default_value(self.expected_type)
+
+
+class EnumNode(PlanNode):
+    __slots__ = ("values", "rng")
+
+    def __init__(self, values, rng):
+        self.values = values
+        self.rng = rng
+
+    @property
+    def may_raise(self):
+        return not isinstance(self.values, (list, tuple, str))
+
+    def generate(self):
+        return self.rng.choice(self.values)
+
+    def distinct_values(self):
+        if not isinstance(self.values, (list, tuple)):
+            return None
+        return _distinct(self.values)
+
+
+class ChoiceNode(PlanNode):
+    __slots__ = ("options", "rng", "may_raise")
+
+    def __init__(self, options, rng):
+        self.options = options
+        self.rng = rng
+        self.may_raise = not options or any(option.may_raise for option in options)
+
+    def generate(self):
+        return self.rng.choice(self.options).generate()
+
+
+class AllOfNode(PlanNode):
+    __slots__ = ("parts", "may_raise")
+
+    def __init__(self, parts):
+        self.parts = parts
+        self.may_raise = any(part.may_raise for part in parts)
+
+    def generate(self):
+        merged = {}
+        for part in self.parts:
+            val = part.generate()
+            if isinstance(val, dict):
+                merged.update(val)
+        return merged
+
+
+class KeywordNode(PlanNode):
+    __slots__ = ("gen", "entry")
+
+    def __init__(self, gen, entry):
+        self.gen = gen
+        self.entry = entry
+
+    @property
+    def may_raise(self):
+        return "method" not in self.entry
+
+    def generate(self):
+        return self.gen._faker_from_entry(self.entry, False, "string")
+
+
+class PooledNode(PlanNode):
+    """A keyword matched value served from a pool of Faker values."""
+
+    __slots__ = ("pool",)
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def generate(self):
+        return self.pool.next()
+
+
+class LocaleRecordNode(PlanNode):
+    """The root of a plan with locale_mode record, which picks a locale for each record."""
+
+    __slots__ = ("gen", "node", "may_raise")
+
+    def __init__(self, gen, node):
+        self.gen = gen
+        self.node = node
+        self.may_raise = node.may_raise
+
+    def generate(self):
+        self.gen.faker.next_record()
+        return self.node.generate()
+
+    def write(self, style, out, level):
+        self.gen.faker.next_record()
+        self.node.write(style, out, level)
+
+
+class UniqueNode(PlanNode):
+    """A field unique across the records of a run, which takes its values from the unique run."""
+
+    __slots__ = ("gen", "node", "index", "may_raise")
+
+    def __init__(self, gen, node, index):
+        self.gen = gen
+        self.node = node
+        self.index = index
+        self.may_raise = node.may_raise
+
+    def generate(self):
+        value = self.node.generate()
+        run = self.gen.unique_run
+        if run is None:
+            # Checked later in record order, see sharding
+            self.gen.unique_values.append((self.index, value))
+            return value
+        if run.take(self.index, value):
+            return value
+        return self.gen.remake_value(self.node, self.index, value)
+
+
+class RecursionGuard:
+    """Counts how deep a recursive $ref is nested in the value being generated."""
+
+    __slots__ = ("max_depth", "depth")
+
+    def __init__(self, max_depth):
+        self.max_depth = max_depth
+        self.depth = 0
+
+
+class RefNode(PlanNode):
+    """
+    A $ref back to a schema that was still being compiled, which makes the plan recursive.
+    The target is linked once that schema is compiled. When the guard's depth is reached
+    the recursion stops and the value is None.
+    """
+
+    __slots__ = ("guard", "target")
+
+    # The target is not known when the parent is compiled
+    may_raise = True
+
+    def __init__(self, guard):
+        self.guard = guard
+        self.target = None
+
+    def exhausted(self):
+        return self.guard.depth >= self.guard.max_depth
+
+    def generate(self):
+        guard = self.guard
+        if guard.depth >= guard.max_depth:
+            return None
+        guard.depth += 1
+        try:
+            return self.target.generate()
+        finally:
+            guard.depth -= 1
+
+    def write(self, style, out, level):
+        guard = self.guard
+        if guard.depth >= guard.max_depth:
+            out.write("null")
+            return
+        guard.depth += 1
+        try:
+            self.target.write(style, out, level)
+        finally:
+            guard.depth -= 1
+
+
+def _optional_refs(properties, required):
+    """Names of optional properties that are recursive refs, left out once exhausted."""
+    return frozenset(
+        name for name, node in properties if isinstance(node, RefNode) and name not in required
+    )
+
+
+def _generate_properties(properties, optional_refs):
+    if optional_refs:
+        return {
+            name: node.generate()
+            for name, node in properties
+            if name not in optional_refs or not node.exhausted()
+        }
+    return {name: node.generate() for name, node in properties}
+
+
+def _write_properties(properties, optional_refs, style, out, level):
+    out.write("{")
+    first = True
+    for name, node in properties:
+        if name in optional_refs and node.exhausted():
+            continue
+        out.write(style.newline(level + 1) if first else "," + style.newline(level + 1))
+        out.write(style.key(name))
+        node.write(style, out, level + 1)
+        first = False
+    out.write("}" if first else style.newline(level) + "}")
+
+
+def _write_items(nodes, style, out, level):
+    out.write("[")
+    first = True
+    for node in nodes:
+        out.write(style.newline(level + 1) if first else "," + style.newline(level + 1))
+        node.write(style, out, level + 1)
+        first = False
+    out.write("]" if first else style.newline(level) + "]")
+
+
+def unique_key(value):
+    """
+    Return a hashable key that is equal for values uniqueItems treats as equal, so objects
+    with their keys in another order and 1 and 1.0 are the same, and true and 1 are not.
+    """
+    if isinstance(value, str) or value is None:
+        return value
+    if isinstance(value, bool):
+        return (bool, value)
+    if isinstance(value, (int, float)):
+        return (float, value)
+    if isinstance(value, dict):
+        return (dict, frozenset((key, unique_key(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return (list, tuple(unique_key(item) for item in value))
+    return (type(value), repr(value))
+
+
+def unique_items(results, target, min_items, node):
+    """
+    Drop the duplicates from results and add new items from node until there are target
+    items. Gives up after UNIQUE_MAX_MISSES duplicates in a row, which is an error when
+    there are fewer than min_items.
+    """
+    seen = set()
+    unique = []
+    for value in results:
+        key = unique_key(value)
+        if key not in seen:
+            seen.add(key)
+            unique.append(value)
+
+    misses = 0
+    while len(unique) < target:
+        value = node.generate()
+        key = unique_key(value)
+        if key in seen:
+            misses += 1
+            if misses >= UNIQUE_MAX_MISSES:
+                break
+            continue
+        seen.add(key)
+        unique.append(value)
+        misses = 0
+
+    if len(unique) < min_items:
+        raise ValueError(
+            f"uniqueItems needs {min_items} items, but only {len(unique)} different values "
+            f"were generated before {UNIQUE_MAX_MISSES} duplicates in a row"
+        )
+    return unique
+
+
+def _distinct(values):
+    seen = set()
+    distinct = []
+    for value in values:
+        key = unique_key(value)
+        if key not in seen:
+            seen.add(key)
+            distinct.append(value)
+    return distinct
+
+
+class ObjectNode(PlanNode):
+    __slots__ = ("properties", "optional_refs", "may_raise")
+
+    def __init__(self, properties, required=()):
+        self.properties = properties
+        self.optional_refs = _optional_refs(properties, required)
+        self.may_raise = any(node.may_raise for _, node in properties)
+
+    def generate(self):
+        return _generate_properties(self.properties, self.optional_refs)
+
+    def write(self, style, out, level):
+        if self.may_raise:
+            super().write(style, out, level)
+        else:
+            _write_properties(self.properties, self.optional_refs, style, out, level)
+
+
+class TypedNode(PlanNode):
+    """Base for nodes with a schema type, which fall back to a default value on errors."""
+
+    __slots__ = ("gen", "rng", "field_name", "schema_type")
+
+    def __init__(self, gen, field_name, schema_type):
+        self.gen = gen
+        self.rng = gen.rng
+        self.field_name = field_name
+        self.schema_type = schema_type
+
+    def _fallback(self, err):
+        logger.warning(
+            'Field "%s" fallback for type "%s": %s', self.field_name, self.schema_type, err
+        )
+        return self.gen._default_value(self.schema_type)
+
+
+class FallbackNode(TypedNode):
+    """A typed value whose schema could not be compiled, so every value is a fallback."""
+
+    __slots__ = ("error",)
+
+    def __init__(self, gen, field_name, schema_type, error):
+        super().__init__(gen, field_name, schema_type)
+        self.error = error
+
+    def generate(self):
+        return self._fallback(self.error)
+
+
+class TypedObjectNode(TypedNode):
+    __slots__ = ("properties", "optional_refs", "streamable")
+
+    def __init__(self, gen, field_name, properties, required=()):
+        super().__init__(gen, field_name, "object")
+        self.properties = properties
+        self.optional_refs = _optional_refs(properties, required)
+        self.streamable = not any(node.may_raise for _, node in properties)
+
+    def generate(self):
+        try:
+            return _generate_properties(self.properties, self.optional_refs)
+        except Exception as err:
+            return self._fallback(err)
+
+    def write(self, style, out, level):
+        if self.streamable:
+            _write_properties(self.properties, self.optional_refs, style, out, level)
+        else:
+            super().write(style, out, level)
+
+
+class BooleanNode(TypedNode):
+    __slots__ = ()
+
+    def generate(self):
+        try:
+            return self.gen.faker.boolean()
+        except Exception as err:
+            return self._fallback(err)
+
+    def distinct_values(self):
+        return (False, True)
+
+
+class NumberNode(TypedNode):
+    __slots__ = ("min_val", "max_val", "is_integer", "low", "high")
+
+    def __init__(self, gen, field_name, schema_type, min_val, max_val):
+        super().__init__(gen, field_name, schema_type)
+        self.min_val = min_val
+        self.max_val = max_val
+        self.is_integer = schema_type == "integer"
+        # The integers the schema allows, both inclusive. An exclusive bound is already
+        # moved past its value, so exclusiveMinimum 5 gives 6 as the lowest integer.
+        self.low = math.ceil(min_val) if self.is_integer else None
+        self.high = math.floor(max_val) if self.is_integer else None
+
+    def generate(self):
+        try:
+            if self.is_integer:
+                return self.rng.randint(self.low, self.high)
+            return self.rng.uniform(self.min_val, self.max_val)
+        except Exception as err:
+            return self._fallback(err)
+
+    def distinct_values(self):
+        if not self.is_integer:
+            return None
+        return range(self.low, self.high + 1)
+
+
+class MultipleOfNode(TypedNode):
+    __slots__ = ("multiple_of", "start", "end", "is_integer")
+
+    def __init__(self, gen, field_name, schema_type, multiple_of, start, end):
+        super().__init__(gen, field_name, schema_type)
+        self.multiple_of = multiple_of
+        self.start = start
+        self.end = end
+        self.is_integer = schema_type == "integer"
+
+    def generate(self):
+        try:
+            value = self.multiple_of * self.rng.randint(self.start, self.end)
+            if self.is_integer:
+                value = int(math.floor(value))
+            return value
+        except Exception as err:
+            return self._fallback(err)
+
+    def distinct_values(self):
+        if not isinstance(self.multiple_of, int) or isinstance(self.multiple_of, bool):
+            return None
+        step = self.multiple_of
+        return range(self.start * step, (self.end + 1) * step, step)
+
+
+class StringNode(TypedNode):
+    __slots__ = ("fmt", "format_handler", "pattern_sampler", "fallback")
+
+    def __init__(self, gen, field_name, fmt, format_handler, pattern_sampler, fallback):
+        super().__init__(gen, field_name, "string")
+        self.fmt = fmt
+        self.format_handler = format_handler
+        self.pattern_sampler = pattern_sampler
+        self.fallback = fallback
+
+    def generate(self):
+        try:
+            if self.format_handler:
+                try:
+                    return self.format_handler()
+                except Exception as e:
+                    logger.warning("Format handler failed: %s - %s", self.fmt, e)
+
+            if self.pattern_sampler:
+                try:
+                    return self.pattern_sampler.sample(self.rng)
+                except Exception as e:
+                    logger.warning(
+                        "Pattern generation failed: %s - %s", self.pattern_sampler.pattern, e
+                    )
+
+            return self.fallback.generate()
+        except Exception as err:
+            return self._fallback(err)
+
+
+class ArrayNode(TypedNode):
+    __slots__ = (
+        "blank",
+        "min_items",
+        "max_items",
+        "items",
+        "tuple_items",
+        "extra_items",
+        "unique_items",
+        "distinct",
+        "recursive_items",
+        "streamable",
+    )
+
+    def __init__(
+        self,
+        gen,
+        field_name,
+        blank,
+        min_items,
+        max_items,
+        items,
+        tuple_items,
+        extra_items,
+        unique,
+        distinct=None,
+    ):
+        super().__init__(gen, field_name, "array")
+        self.blank = blank
+        self.min_items = min_items
+        self.max_items = max_items
+        self.items = items
+        self.tuple_items = tuple_items
+        self.extra_items = extra_items
+        self.unique_items = unique
+        # The values of the items when they are few enough to sample without replacement
+        self.distinct = distinct
+        self.recursive_items = isinstance(items, RefNode)
+        children = (items, extra_items) + (tuple_items or ())
+        # Unique items are only known once the whole array is made
+        self.streamable = not unique and not any(
+            node.may_raise for node in children if node is not None
+        )
+
+    def generate(self):
+        try:
+            # A recursive array gives no items once its recursion depth is reached
+            if self.recursive_items and self.items.exhausted():
+                return []
+
+            length = 0 if self.blank else self.rng.randint(self.min_items, self.max_items)
+
+            if self.tuple_items is not None:
+                results = [node.generate() for node in self.tuple_items[:length]]
+                if self.extra_items and length > len(self.tuple_items):
+                    extra = self.extra_items
+                    results.extend(extra.generate() for _ in range(length - len(self.tuple_items)))
+                if self.unique_items:
+                    results = unique_items(results, self.min_items, self.min_items, self.items)
+            elif not self.unique_items:
+                items = self.items
+                results = [items.generate() for _ in range(length)]
+            elif self.distinct is not None:
+                results = self.rng.sample(self.distinct, min(length, len(self.distinct)))
+            else:
+                results = unique_items((), length, self.min_items, self.items)
+
+            return results
+        except Exception as err:
+            return self._fallback(err)
+
+    def write(self, style, out, level):
+        if not self.streamable:
+            super().write(style, out, level)
+            return
+
+        if self.recursive_items and self.items.exhausted():
+            out.write("[]")
+            return
+        try:
+            length = 0 if self.blank else self.rng.randint(self.min_items, self.max_items)
+        except Exception as err:
+            out.write(style.encode(self._fallback(err), level))
+            return
+
+        if self.tuple_items is None:
+            nodes = repeat(self.items, length)
+        else:
+            nodes = self.tuple_items[:length]
+            if self.extra_items and length > len(self.tuple_items):
+                nodes = chain(nodes, repeat(self.extra_items, length - len(self.tuple_items)))
+        _write_items(nodes, style, out, level)
+
+
+class VectorArrayNode(TypedNode):
+    """An array of simple numeric, boolean or enum items, drawn all at once with NumPy."""
+
+    __slots__ = ("min_items", "max_items", "draw", "items", "unique_items", "distinct")
+
+    def __init__(self, gen, field_name, min_items, max_items, draw, items, unique, distinct=None):
+        super().__init__(gen, field_name, "array")
+        self.min_items = min_items
+        self.max_items = max_items
+        self.draw = draw
+        self.items = items
+        self.unique_items = unique
+        self.distinct = distinct
+
+    def generate(self):
+        try:
+            length = self.rng.randint(self.min_items, self.max_items)
+            results = self.draw(length, self.unique_items)
+
+            if self.unique_items:
+                # Countable values are drawn without replacement, up to as many as there are
+                if self.distinct is not None:
+                    length = min(length, len(self.distinct))
+                results = unique_items(results, length, self.min_items, self.items)
+
+            return results
+        except Exception as err:
+            return self._fallback(err)
@@ -0,0 +1,202 @@
+"""
+An opt-in profiler for generation, used by --profile
+
+When a generator has a profiler, the plan nodes of every property and array item are
+wrapped in a ProfiledNode that counts calls and time by JSON path, and Faker calls are
+counted by method. Fallbacks and warnings logged while a path is generated are counted for
+that path. Without a profiler the plan is not wrapped, so generation runs as usual.
+"""
+
+import logging
+import time
+from src.plan import PlanNode
+
+# Rows shown by Profiler.report
+REPORT_ROWS = 20
+
+
+class PathStats:
+    __slots__ = ("calls", "total", "children", "fallbacks", "warnings")
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.children = 0.0
+        self.fallbacks = 0
+        self.warnings = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "total_ms": self.total * 1000,
+            "self_ms": (self.total - self.children) * 1000,
+            "fallbacks": self.fallbacks,
+            "warnings": self.warnings,
+        }
+
+
+class Profiler:
+    """Collects the time spent per JSON path and per Faker method."""
+
+    def __init__(self):
+        self.paths = {}
+        self.faker_methods = {}
+        self.records = 0
+        self.elapsed = 0.0
+        self._stack = []
+        self._handler = _CountingHandler(self)
+        self._started = None
+
+    def start(self):
+        """Start counting logged fallbacks and warnings, and the total time."""
+        logging.getLogger("src").addHandler(self._handler)
+        self._started = time.perf_counter()
+
+    def stop(self, records: int):
+        self.elapsed += time.perf_counter() - self._started
+        self.records += records
+        logging.getLogger("src").removeHandler(self._handler)
+
+    def wrap(self, node, path: str):
+        stats = self.paths.get(path)
+        if stats is None:
+            stats = self.paths[path] = PathStats()
+        return ProfiledNode(self, node, stats)
+
+    def wrap_faker(self, faker_instance):
+        return ProfiledFaker(self, faker_instance)
+
+    def to_dict(self) -> dict:
+        return {
+            "records": self.records,
+            "elapsed_ms": self.elapsed * 1000,
+            "paths": {path: stats.to_dict() for path, stats in self._ranked_paths()},
+            "faker_methods": {
+                method: {"calls": calls, "total_ms": total * 1000}
+                for method, (calls, total) in self._ranked_faker_methods()
+            },
+        }
+
+    def report(self, rows: int = REPORT_ROWS) -> str:
+        """Return the slowest paths by their own time and the slowest Faker methods."""
+        lines = [
+            f"Profile of {self.records} records in {self.elapsed:.2f}s",
+            "",
+            f"{'path':<48}{'calls':>10}{'total ms':>11}{'self ms':>10}{'fallbacks':>11}"
+            f"{'warnings':>10}",
+        ]
+        for path, stats in self._ranked_paths()[:rows]:
+            values = stats.to_dict()
+            lines.append(
+                f"{_clip(path, 47):<48}{stats.calls:>10}{values['total_ms']:>11.1f}"
+                f"{values['self_ms']:>10.1f}{stats.fallbacks:>11}{stats.warnings:>10}"
+            )
+
+        lines += ["", f"{'faker method':<48}{'calls':>10}{'total ms':>11}"]
+        for method, (calls, total) in self._ranked_faker_methods()[:rows]:
+            lines.append(f"{_clip(method, 47):<48}{calls:>10}{total * 1000:>11.1f}")
+        return "\n".join(lines)
+
+    def _ranked_paths(self):
+        return sorted(
+            self.paths.items(), key=lambda item: item[1].total - item[1].children, reverse=True
+        )
+
+    def _ranked_faker_methods(self):
+        return sorted(self.faker_methods.items(), key=lambda item: item[1][1], reverse=True)
+
+    def _enter(self, stats):
+        self._stack.append(stats)
+
+    def _exit(self, stats, elapsed):
+        self._stack.pop()
+        stats.calls += 1
+        stats.total += elapsed
+        if self._stack:
+            self._stack[-1].children += elapsed
+
+    def _call_faker(self, method_name, method, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            calls, total = self.faker_methods.get(method_name, (0, 0.0))
+            self.faker_methods[method_name] = (calls + 1, total + time.perf_counter() - start)
+
+
+class ProfiledNode(PlanNode):
+    """Counts the calls and time of the node it wraps."""
+
+    __slots__ = ("profiler", "node", "stats", "may_raise")
+
+    def __init__(self, profiler, node, stats):
+        self.profiler = profiler
+        self.node = node
+        self.stats = stats
+        self.may_raise = node.may_raise
+
+    def generate(self):
+        profiler = self.profiler
+        profiler._enter(self.stats)
+        start = time.perf_counter()
+        try:
+            return self.node.generate()
+        finally:
+            profiler._exit(self.stats, time.perf_counter() - start)
+
+    def write(self, style, out, level):
+        profiler = self.profiler
+        profiler._enter(self.stats)
+        start = time.perf_counter()
+        try:
+            self.node.write(style, out, level)
+        finally:
+            profiler._exit(self.stats, time.perf_counter() - start)
+
+    def distinct_values(self):
+        return self.node.distinct_values()
+
+
+class ProfiledFaker:
+    """Stands in for a Faker instance and counts the calls and time of its methods."""
+
+    def __init__(self, profiler, faker_instance):
+        self._profiler = profiler
+        self._faker = faker_instance
+
+    def seed_instance(self, seed):
+        self._faker.seed_instance(seed)
+
+    def next_record(self):
+        self._faker.next_record()
+
+    def __getattr__(self, name):
+        value = getattr(self._faker, name)
+        if name.startswith("_") or not callable(value):
+            return value
+
+        def method(*args, **kwargs):
+            return self._profiler._call_faker(name, value, *args, **kwargs)
+
+        return method
+
+
+class _CountingHandler(logging.Handler):
+    """Counts the fallbacks and warnings logged while a path is being generated."""
+
+    def __init__(self, profiler):
+        super().__init__(logging.WARNING)
+        self.profiler = profiler
+
+    def emit(self, record):
+        stack = self.profiler._stack
+        if not stack:
+            return
+        if isinstance(record.msg, str) and " fallback for type " in record.msg:
+            stack[-1].fallbacks += 1
+        else:
+            stack[-1].warnings += 1
+
+
+def _clip(text: str, width: int) -> str:
+    return text if len(text) <= width else "..." + text[-(width - 3) :]
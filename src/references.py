@@ -0,0 +1,107 @@
+"""
+Keys shared between the schemas of a batch run
+
+A field with "x-foreign-key": "customers.id" takes its values from the id field of the
+records generated for the schema customers.json in the same run. The schemas are
+generated in an order where every schema comes after the ones it refers to, and the keys
+of a referenced field are collected while its records are written. A field with a
+foreign key in a run without that schema is generated from the rest of its schema.
+"""
+
+import random
+
+FOREIGN_KEY = "x-foreign-key"
+
+# Keys kept per referenced field. Larger runs keep a uniform sample of this size.
+DEFAULT_KEY_SAMPLE_SIZE = 1_000_000
+
+
+def parse_foreign_key(value) -> tuple[str, tuple[str, ...]]:
+    """Split "schema.field.subfield" into the schema name and the path of the key field."""
+    if not isinstance(value, str) or "." not in value:
+        raise ValueError(f'{FOREIGN_KEY} must be "schema.field", got {value!r}')
+    schema_name, field = value.split(".", 1)
+    return schema_name, tuple(field.split("."))
+
+
+def find_foreign_keys(schema) -> set[str]:
+    """Return every foreign key used anywhere in a schema."""
+    found = set()
+    stack = [schema]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            if FOREIGN_KEY in node:
+                found.add(node[FOREIGN_KEY])
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            stack.extend(node)
+    return found
+
+
+def order_schemas(names: list[str], dependencies: dict) -> list[str]:
+    """
+    Order schema names so every schema comes after the schemas it depends on, keeping the
+    given order otherwise. dependencies maps a name to the set of names it refers to.
+    """
+    ordered = []
+    done = set()
+    visiting = []
+
+    def visit(name):
+        if name in done:
+            return
+        if name in visiting:
+            cycle = " -> ".join(visiting[visiting.index(name) :] + [name])
+            raise ValueError(f"Foreign keys refer to each other in a cycle: {cycle}")
+        visiting.append(name)
+        for dependency in sorted(dependencies.get(name, ())):
+            visit(dependency)
+        visiting.pop()
+        done.add(name)
+        ordered.append(name)
+
+    for name in names:
+        visit(name)
+    return ordered
+
+
+class KeyIndex:
+    """
+    The keys generated for one field. Up to sample_size keys are kept, after that a uniform
+    sample of them (reservoir sampling), so memory stays bounded for very large parents.
+    """
+
+    __slots__ = ("name", "keys", "seen", "sample_size", "rng")
+
+    def __init__(self, name: str, seed, sample_size: int = DEFAULT_KEY_SAMPLE_SIZE):
+        if not isinstance(sample_size, int) or sample_size < 1:
+            raise ValueError(f"foreign_key_sample_size must be 1 or more: {sample_size}")
+        self.name = name
+        self.keys = []
+        self.seen = 0
+        self.sample_size = sample_size
+        self.rng = random.Random(f"{seed}-{name}")
+
+    def add(self, key):
+        self.seen += 1
+        if len(self.keys) < self.sample_size:
+            self.keys.append(key)
+            return
+        slot = self.rng.randrange(self.seen)
+        if slot < self.sample_size:
+            self.keys[slot] = key
+
+    def add_record(self, record, path: tuple[str, ...]):
+        """Add the key at path in a record. A path through arrays adds the key of every item."""
+        values = [record]
+        for name in path:
+            values = [
+                item[name]
+                for value in values
+                for item in (value if isinstance(value, list) else [value])
+                if isinstance(item, dict) and item.get(name) is not None
+            ]
+        for value in values:
+            for key in value if isinstance(value, list) else [value]:
+                self.add(key)
@@ -0,0 +1,272 @@
+"""
+A local HTTP server that keeps Faker and compiled schemas loaded between requests
+
+Requests are POST /generate with a JSON body, see MockaService.generate for the fields.
+GET /health answers {"status": "ok"} once the server is up.
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import logging
+import os
+import queue
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.cli import DEFAULT_SERVE_HOST, DEFAULT_SERVE_PORT
+from src.faker_config import FakerCache, resolve_seed
+from src.file_loader import InputLoadError, load_document
+from src.generator import SchemaGenerator
+from src.output import OUTPUT_FORMATS, OutputStream, write_document, write_records
+from src.tabular import table_columns
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = DEFAULT_SERVE_HOST
+DEFAULT_PORT = DEFAULT_SERVE_PORT
+
+# Compiled plans kept per context, by schema content and options
+PLAN_CACHE_SIZE = 128
+
+# Requests generating at the same time, each with its own Fakers and plans
+DEFAULT_CONCURRENCY = os.cpu_count() or 4
+
+# Records one request can ask for. The response is built in memory before it is sent,
+# so a larger count is answered with status 400 instead of filling the memory
+MAX_COUNT = 100_000
+
+# Formats answered as text, Parquet is written to files only
+SERVED_FORMATS = tuple(name for name in OUTPUT_FORMATS if name != "parquet")
+
+CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "tsv": "text/tab-separated-values",
+}
+
+
+class RequestError(Exception):
+    """A generate request that is not valid, answered with status 400."""
+
+
+class MockaService:
+    """
+    Answers generate requests with one config. Faker instances are kept per locale and
+    compiled plans per schema content hash, so a request only reseeds and generates.
+    The same seed gives the same output as the command line.
+    """
+
+    def __init__(self, config: dict, max_concurrent: int = DEFAULT_CONCURRENCY):
+        self.config = config
+        # Requests generate in parallel, each with a context of its own Fakers and plans.
+        # Contexts are made when needed and kept for later requests.
+        self._contexts = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+
+    def warm_up(self):
+        """Create a context with its Faker instances before the first request."""
+        context = _ServiceContext(self.config)
+        context.fakers.warm_up()
+        self._contexts.put(context)
+
+    def generate(self, request: dict) -> tuple[str, int]:
+        """
+        Generate the records for a request and return them as text, with the seed used.
+        The request holds "schema" (an object) or "schema_path" (a file on this machine),
+        and optionally "count", "start", "seed", "format", "compact", "include_optional",
+        "keymatch" and "blank", with the same meaning as the command line options.
+        """
+        args = _parse_request(request)
+        schema, args.schema = _request_schema(request)
+        content = json.dumps(schema, ensure_ascii=False, separators=(",", ":"))
+        schema_hash = hashlib.sha256(content.encode()).hexdigest()
+        seed = resolve_seed(self.config, args.seed)
+
+        buffer = io.StringIO()
+        out = OutputStream([buffer])
+        with self._context() as context:
+            key = (schema_hash, args.schema, args.include_optional, args.keymatch, args.blank)
+            generator, plan = context.plan(key, seed, schema, args)
+            if args.count == 1 and args.format == "json":
+                write_document(generator.document(plan, seed, args.start), out, args.compact)
+            else:
+                records = generator.records(plan, seed, args.count, args.start)
+                write_records(records, out, args.format, args.compact, table_columns(plan))
+            out.close()
+
+        return buffer.getvalue(), seed
+
+    @contextmanager
+    def _context(self):
+        with self._slots:
+            try:
+                context = self._contexts.get_nowait()
+            except queue.Empty:
+                context = _ServiceContext(self.config)
+            try:
+                yield context
+            finally:
+                self._contexts.put(context)
+
+
+class _ServiceContext:
+    """The Faker instances and compiled plans used by one request at a time."""
+
+    def __init__(self, config: dict):
+        self.config = config
+        self.fakers = FakerCache(config)
+        self._plans = OrderedDict()
+
+    def plan(self, key, seed, schema, args):
+        faker = self.fakers.get(seed)
+        cached = self._plans.get(key)
+        # A plan with a $ref to another file is compiled again once that file changes
+        if cached and _file_mtimes(cached[2]) == cached[3]:
+            self._plans.move_to_end(key)
+            generator, plan = cached[:2]
+            # The key leaves out start, so it is checked against the plan here as in compile
+            generator.check_start(args.start)
+            # The plan reads the Faker from its generator, so it can take this run's Faker
+            generator.faker = faker
+            generator.reset(seed)
+            return generator, plan
+
+        generator = SchemaGenerator(self.config, faker, seed)
+        plan = generator.compile(generator.prepare_schema(schema), args, args.schema)
+        files = sorted(generator.referenced_files())
+        self._plans[key] = (generator, plan, files, _file_mtimes(files))
+        self._plans.move_to_end(key)
+        if len(self._plans) > PLAN_CACHE_SIZE:
+            self._plans.popitem(last=False)
+        return generator, plan
+
+
+class MockaServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Many CI jobs may connect at once
+    request_queue_size = 128
+
+    def __init__(self, address, service: MockaService):
+        super().__init__(address, RequestHandler)
+        self.service = service
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/health":
+            self._send(200, json.dumps({"status": "ok"}))
+        else:
+            self._send(404, json.dumps({"error": f"Not found: {self.path}"}))
+
+    def do_POST(self):
+        if self.path != "/generate":
+            self._send(404, json.dumps({"error": f"Not found: {self.path}"}))
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(request, dict):
+                raise RequestError("The request must be a JSON object")
+            body, seed = self.server.service.generate(request)
+        except (RequestError, ValueError) as err:
+            self._send(400, json.dumps({"error": str(err)}))
+            return
+        except Exception as err:
+            logger.warning("Generate request failed: %s", err)
+            self._send(500, json.dumps({"error": str(err)}))
+            return
+
+        content_type = CONTENT_TYPES.get(request.get("format"), "application/json")
+        self._send(200, body, content_type, {"X-Mocka-Seed": str(seed)})
+
+    def _send(self, status, body, content_type="application/json", headers=None):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, fmt, *args):
+        logger.debug("%s - %s", self.address_string(), fmt % args)
+
+
+def serve(config: dict, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+    """Run the server until it is interrupted."""
+    service = MockaService(config)
+    service.warm_up()
+    server = MockaServer((host, port), service)
+    logger.info("Serving on http://%s:%d", host, server.server_address[1])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Server stopped")
+    finally:
+        server.server_close()
+
+
+def _file_mtimes(paths) -> list:
+    mtimes = []
+    for path in paths:
+        try:
+            mtimes.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            mtimes.append(None)
+    return mtimes
+
+
+def _parse_request(request: dict) -> argparse.Namespace:
+    count = request.get("count", 1)
+    if not isinstance(count, int) or isinstance(count, bool) or count < 1:
+        raise RequestError(f"count must be 1 or more, got {count}")
+    if count > MAX_COUNT:
+        raise RequestError(f"count must be {MAX_COUNT} or less, got {count}")
+
+    start = request.get("start", 0)
+    if not isinstance(start, int) or isinstance(start, bool) or start < 0:
+        raise RequestError(f"start must be 0 or more, got {start}")
+
+    seed = request.get("seed")
+    if seed is not None and (not isinstance(seed, int) or isinstance(seed, bool)):
+        raise RequestError(f"seed must be an integer, got {seed}")
+
+    output_format = request.get("format", "json")
+    if output_format not in SERVED_FORMATS:
+        raise RequestError(f"format must be one of {', '.join(SERVED_FORMATS)}")
+
+    flags = {}
+    for name, default in (
+        ("compact", False),
+        ("include_optional", True),
+        ("keymatch", True),
+        ("blank", False),
+    ):
+        flags[name] = request.get(name, default)
+        if not isinstance(flags[name], bool):
+            raise RequestError(f"{name} must be true or false")
+
+    return argparse.Namespace(
+        schema=None, count=count, start=start, seed=seed, format=output_format, **flags
+    )
+
+
+def _request_schema(request: dict) -> tuple[dict, str | None]:
+    if "schema" in request:
+        schema = request["schema"]
+        if not isinstance(schema, dict):
+            raise RequestError("schema must be a JSON object")
+        return schema, None
+
+    schema_path = request.get("schema_path")
+    if not isinstance(schema_path, str):
+        raise RequestError("The request needs a schema object or a schema_path")
+    try:
+        return load_document(schema_path), os.path.abspath(schema_path)
+    except InputLoadError as err:
+        raise RequestError(str(err)) from err
@@ -0,0 +1,123 @@
+"""
+Functions for generating many records in parallel over a process pool
+"""
+
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from src.faker_config import FakerCache
+from src.generator import SchemaGenerator
+from src.output import join_records, serialize_record, serialize_records
+from src.tabular import table_columns
+from src.unique import UniqueRun
+
+logger = logging.getLogger(__name__)
+
+# Records per shard. Every record is seeded by its index, so the output is the same as
+# generating all records in one process.
+SHARD_SIZE = 5000
+
+_worker_state = {}
+
+
+def shard_ranges(count: int, start: int = 0, shard_size: int = SHARD_SIZE):
+    """Split count records from index start into (first record index, record count) pairs."""
+    return [
+        (first, min(shard_size, start + count - first))
+        for first in range(start, start + count, shard_size)
+    ]
+
+
+def generate_shards(config: dict, schema: dict, args, base_seed: int, workers: int):
+    """
+    Generate args.count records over a pool of worker processes.
+    Yields (text, count) chunks of serialized records in shard order.
+    """
+    checker = None
+    for first, result in _run_shards(config, schema, args, base_seed, workers):
+        if isinstance(result, list):
+            # A shard with unique fields returns its records with their values, to check here
+            if checker is None:
+                checker = _UniqueChecker(config, schema, args, base_seed)
+            result = checker.check(first, result)
+        yield result
+
+
+def _run_shards(config, schema, args, base_seed, workers):
+    shards = shard_ranges(args.count, args.start)
+    logger.debug("Generating %d shards on %d workers", len(shards), workers)
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(config, schema, args, base_seed),
+    ) as executor:
+        # Keep a bounded number of shards in flight so memory stays flat
+        pending = deque()
+        for first, shard_count in shards:
+            pending.append((first, executor.submit(_generate_shard, first, shard_count)))
+            if len(pending) >= workers * 2:
+                first, future = pending.popleft()
+                yield first, future.result()
+        while pending:
+            first, future = pending.popleft()
+            yield first, future.result()
+
+
+class _UniqueChecker:
+    """
+    Checks the unique fields of the shards in record order, as a run in one process does,
+    and makes the records with repeated values again here.
+    """
+
+    def __init__(self, config, schema, args, seed):
+        self.args = args
+        self.seed = seed
+        self.generator = SchemaGenerator(config, FakerCache(config).get(seed), seed)
+        self.plan = self.generator.compile(schema, args, args.schema)
+        self.columns = table_columns(self.plan)
+        self.run = UniqueRun(
+            self.generator.unique_fields, args.count, self.generator.unique_exact_limit
+        )
+
+    def check(self, first: int, records) -> tuple[str, int]:
+        parts = []
+        for index, (text, values) in enumerate(records, first):
+            if not self.run.accept(values):
+                # Made again with its values taken as they are made, as in one process
+                record = self.generator.checked_record(self.run, self.plan, self.seed, index)
+                text = serialize_record(record, self.args.format, self.args.compact, self.columns)
+            parts.append(text)
+        return join_records(parts, self.args.format, self.args.compact)
+
+
+def _init_worker(config, schema, args, base_seed):
+    _worker_state.update(
+        config=config, schema=schema, args=args, base_seed=base_seed, fakers=FakerCache(config)
+    )
+
+
+def _generate_shard(first: int, count: int):
+    config = _worker_state["config"]
+    args = _worker_state["args"]
+    seed = _worker_state["base_seed"]
+
+    # The plan is compiled once per worker. Resetting the generator drops the pooled values
+    # of the last shard, so a shard does not depend on the shards the worker made before.
+    if "plan" in _worker_state:
+        generator, plan = _worker_state["plan"]
+        generator.reset(seed)
+    else:
+        generator = SchemaGenerator(config, _worker_state["fakers"].get(seed), seed)
+        plan = generator.compile(_worker_state["schema"], args, args.schema)
+        _worker_state["plan"] = (generator, plan)
+
+    columns = table_columns(plan)
+    if generator.unique_fields:
+        return [
+            (serialize_record(record, args.format, args.compact, columns), values)
+            for record, values in generator.unchecked_records(plan, seed, count, first)
+        ]
+
+    records = generator.records(plan, seed, count, first)
+    return serialize_records(records, args.format, args.compact, columns)
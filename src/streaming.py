@@ -0,0 +1,131 @@
+"""
+An asyncio API for generating records as a stream
+
+    records = AsyncRecords(schema, seed=42)
+    async with records:
+        async for record in records.stream(1000):
+            await queue.put(record)
+
+Records are generated in batches on a thread of their own, so the event loop stays
+responsive while a large record is made. At most prefetch batches are made ahead of the
+consumer, so a slow consumer pauses generation and memory stays bounded by
+prefetch * batch_size records. The same seed gives the same records as the command line.
+"""
+
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from src.faker_config import FakerCache, app_config, resolve_seed
+from src.generator import SchemaGenerator
+
+# Records made per batch, on the thread of the stream
+DEFAULT_BATCH_SIZE = 100
+
+# Batches made ahead of the consumer before generation waits for it
+DEFAULT_PREFETCH = 4
+
+
+class AsyncRecords:
+    """
+    Generates the records of a schema for asyncio code. Faker is created and the schema
+    compiled on the generating thread when the first stream starts, and kept for later
+    streams. Streams of one AsyncRecords run one at a time, a second one waits for the
+    first to finish, so use one AsyncRecords per concurrent stream.
+    """
+
+    def __init__(
+        self,
+        schema: dict,
+        config: dict | None = None,
+        seed: int | None = None,
+        schema_path: str | None = None,
+        include_optional: bool = True,
+        keymatch: bool = True,
+        blank: bool = False,
+    ):
+        self.schema = schema
+        self.config = app_config if config is None else config
+        self.seed = resolve_seed(self.config, seed)
+        self.args = argparse.Namespace(
+            schema=schema_path,
+            start=0,
+            include_optional=include_optional,
+            keymatch=keymatch,
+            blank=blank,
+        )
+        self.generator = None
+        self.plan = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mocka-stream")
+        self._lock = asyncio.Lock()
+
+    async def stream(
+        self,
+        count: int,
+        start: int = 0,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        prefetch: int = DEFAULT_PREFETCH,
+    ):
+        """Yield records start to start + count - 1, one at a time."""
+        async for batch in self.batches(count, start, batch_size, prefetch):
+            for record in batch:
+                yield record
+
+    async def batches(
+        self,
+        count: int,
+        start: int = 0,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        prefetch: int = DEFAULT_PREFETCH,
+    ):
+        """Yield records start to start + count - 1 in lists of up to batch_size records."""
+        if batch_size < 1 or prefetch < 1:
+            raise ValueError("batch_size and prefetch must be 1 or more")
+
+        async with self._lock:
+            records = self._records(count, start)
+            # The thread makes the batches in the order they are submitted
+            pending = [self._executor.submit(_take, records, batch_size) for _ in range(prefetch)]
+            try:
+                while pending:
+                    batch = await asyncio.wrap_future(pending.pop(0))
+                    if not batch:
+                        break
+                    pending.append(self._executor.submit(_take, records, batch_size))
+                    yield batch
+            finally:
+                # Left early. A batch that is being made finishes on the thread before the
+                # batches of the next stream, as the thread runs one at a time.
+                for future in pending:
+                    future.cancel()
+
+    def _records(self, count, start):
+        # Runs on the thread of the stream, as compiling a large schema takes a while
+        if self.plan is None:
+            faker = FakerCache(self.config).get(self.seed)
+            self.generator = SchemaGenerator(self.config, faker, self.seed)
+            self.plan = self.generator.compile(
+                self.generator.prepare_schema(self.schema), self.args, self.args.schema
+            )
+        if start and (self.generator.faker_pools or self.generator.unique_fields):
+            # Pooled values and unique fields depend on the records made before start
+            raise ValueError("start can not be used with faker_pool_size or unique fields")
+
+        # Every stream starts from the seed, like a new run
+        self.generator.reset(self.seed)
+        yield from self.generator.records(self.plan, self.seed, count, start)
+
+    async def close(self):
+        """Stop the generating thread once the stream that is running has finished."""
+        async with self._lock:
+            self._executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+def _take(records, size: int) -> list:
+    return list(islice(records, size))
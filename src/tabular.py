@@ -0,0 +1,217 @@
+"""
+Functions for writing records as rows of CSV, TSV or Parquet
+
+The columns come from the properties of the compiled plan: a nested object gives a
+column per property with a dotted name, such as address.city, also when it is made of
+allOf parts or oneOf options, and arrays and other values get one column holding their
+JSON. Rows are converted and written in chunks of TABLE_CHUNK_ROWS records, so the
+records are streamed like the JSON output.
+
+Parquet is optional and needs pyarrow (pip install pyarrow), which is imported by
+write_parquet. CSV and TSV only use the standard library. Parquet files compress their
+columns themselves, with snappy unless gzip or zstd is given.
+"""
+
+import csv
+import io
+import json
+from itertools import islice
+from src.plan import (
+    AllOfNode,
+    ChoiceNode,
+    ConstNode,
+    EnumNode,
+    ObjectNode,
+    RefNode,
+    TypedObjectNode,
+)
+
+DELIMITERS = {"csv": ",", "tsv": "\t"}
+TABLE_FORMATS = tuple(DELIMITERS) + ("parquet",)
+
+# Codecs of --compress that Parquet has for its columns
+PARQUET_COMPRESSIONS = ("gzip", "zstd")
+
+# Records converted to rows and written at a time
+TABLE_CHUNK_ROWS = 10000
+
+
+class Column:
+    """A column of the table, with the path of its value in a record and its value type."""
+
+    __slots__ = ("name", "path", "kind")
+
+    def __init__(self, path: tuple[str, ...], kind: str):
+        self.name = ".".join(path) or "value"
+        self.path = path
+        # "integer", "number", "boolean" or "string", which also holds the JSON of other values
+        self.kind = kind
+
+
+def table_columns(plan) -> list[Column]:
+    """Return the columns for the records of a plan, in the order of its properties."""
+    columns = []
+    _add_columns(plan, (), columns)
+    return columns
+
+
+def _add_columns(node, path, columns):
+    properties = _properties(node)
+    if properties:
+        names = set()
+        for name, child in properties:
+            # allOf and oneOf give each name once, from the first part that has it
+            if name not in names:
+                names.add(name)
+                _add_columns(child, path + (name,), columns)
+    else:
+        columns.append(Column(path, _node_kind(_unwrap(node))))
+
+
+def _properties(node):
+    """Return the (name, node) properties of an object node, or None for other values."""
+    node = _unwrap(node)
+    if isinstance(node, (ObjectNode, TypedObjectNode)):
+        return node.properties
+    # The parts of allOf are merged, and a oneOf or anyOf value is one of the options
+    if isinstance(node, (AllOfNode, ChoiceNode)):
+        parts = node.parts if isinstance(node, AllOfNode) else node.options
+        found = [_properties(part) for part in parts]
+        if found and all(found):
+            return [prop for properties in found for prop in properties]
+    return None
+
+
+def _unwrap(node):
+    # Wrappers such as unique fields, profiling and locale records hold the value node
+    while not isinstance(node, RefNode) and hasattr(node, "node"):
+        node = node.node
+    return node
+
+
+def _node_kind(node) -> str:
+    if isinstance(node, ConstNode):
+        return _values_kind([node.value])
+    if isinstance(node, EnumNode) and isinstance(node.values, (list, tuple)):
+        return _values_kind(node.values)
+    schema_type = getattr(node, "schema_type", None)
+    return schema_type if schema_type in ("integer", "number", "boolean") else "string"
+
+
+def _values_kind(values) -> str:
+    if all(isinstance(value, bool) for value in values):
+        return "boolean"
+    if any(isinstance(value, bool) for value in values):
+        return "string"
+    if all(isinstance(value, int) for value in values):
+        return "integer"
+    if all(isinstance(value, (int, float)) for value in values):
+        return "number"
+    return "string"
+
+
+def table_header(columns: list[Column], output_format: str) -> str:
+    return _write_rows([[column.name for column in columns]], output_format)
+
+
+def serialize_rows(records, columns: list[Column], output_format: str) -> tuple[str, int]:
+    """Serialize records as CSV or TSV rows, without the header, with the record count."""
+    rows = [[_cell(value) for value in _row(record, columns)] for record in records]
+    return _write_rows(rows, output_format), len(rows)
+
+
+def record_chunks(records, size: int = TABLE_CHUNK_ROWS):
+    """Split records into lists of up to size records."""
+    records = iter(records)
+    while chunk := list(islice(records, size)):
+        yield chunk
+
+
+def write_parquet(records, columns: list[Column], path: str, compression=None, level=None) -> int:
+    """Write records to a Parquet file, one row group per chunk, and return the count."""
+    if compression and compression not in PARQUET_COMPRESSIONS:
+        raise ValueError(f"Parquet is compressed with {' or '.join(PARQUET_COMPRESSIONS)}")
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as err:  # pyarrow is optional
+        raise ValueError("--format parquet needs pyarrow, pip install pyarrow") from err
+
+    types = {
+        "integer": pyarrow.int64(),
+        "number": pyarrow.float64(),
+        "boolean": pyarrow.bool_(),
+        "string": pyarrow.string(),
+    }
+    schema = pyarrow.schema([(column.name, types[column.kind]) for column in columns])
+    convert = [_PARQUET_VALUES[column.kind] for column in columns]
+
+    count = 0
+    options = {"compression": compression, "compression_level": level} if compression else {}
+    with pyarrow.parquet.ParquetWriter(path, schema, **options) as writer:
+        for chunk in record_chunks(records):
+            rows = [_row(record, columns) for record in chunk]
+            arrays = [
+                pyarrow.array([to_value(row[i]) for row in rows], type=types[column.kind])
+                for i, (column, to_value) in enumerate(zip(columns, convert))
+            ]
+            writer.write_table(pyarrow.Table.from_arrays(arrays, schema=schema))
+            count += len(rows)
+    return count
+
+
+def _row(record, columns):
+    row = []
+    for column in columns:
+        value = record
+        for name in column.path:
+            value = value.get(name) if isinstance(value, dict) else None
+        row.append(value)
+    return row
+
+
+def _write_rows(rows, output_format: str) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=DELIMITERS[output_format], lineterminator="\n")
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+def _cell(value) -> str:
+    if value is None:
+        return ""
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if isinstance(value, (dict, list)):
+        return _json(value)
+    return str(value)
+
+
+def _json(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def _integer(value):
+    return value if isinstance(value, int) and not isinstance(value, bool) else None
+
+
+def _number(value):
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def _boolean(value):
+    return value if isinstance(value, bool) else None
+
+
+def _string(value):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return _json(value) if isinstance(value, (dict, list)) else str(value)
+
+
+# Values that do not fit the type of their column, such as fallbacks, are written as null
+_PARQUET_VALUES = {"integer": _integer, "number": _number, "boolean": _boolean, "string": _string}
@@ -0,0 +1,218 @@
+"""
+Tracking of fields that are unique across all records of a run
+
+A field is unique when its schema has "x-unique": true or its name is in the unique_fields
+config option. A value is taken as it is made, and a value taken before is made again on
+its own with the next seed of its record, see SchemaGenerator.remake_value. A field with
+an integer range takes the next value in the range that is not taken instead, so it can
+fill the whole range. With --workers the records are checked in order, and a record with
+a repeated value is made again with its values taken as they are made, so the output is
+the same as a run in one process.
+
+Each field has a tracker suited to its values, so memory stays bounded in large runs:
+integer ranges use a bitmap with one bit per value, runs of up to unique_exact_limit
+records keep the values in a set, and longer runs use a Bloom filter sized for the run.
+A Bloom filter can report a new value as seen, which only makes a record again, so the
+values stay unique.
+"""
+
+import hashlib
+import json
+import re
+from src.plan import unique_key
+
+# Times a value is made again before a run gives up on finding a unique value for it
+UNIQUE_MAX_ATTEMPTS = 100
+
+# Runs with more records keep the values of a field in a Bloom filter instead of a set
+DEFAULT_EXACT_LIMIT = 1_000_000
+
+# Integer ranges with up to this many values are tracked in a bitmap, 16 MB at most
+BITMAP_MAX_VALUES = 2**27
+
+# About one false positive in a hundred values for a filter holding the whole run
+BLOOM_BITS_PER_VALUE = 10
+BLOOM_HASHES = 7
+
+# A byte of a RangeBitmap with a value that is not taken
+_FREE_BYTE = re.compile(rb"[^\xff]")
+
+
+class UniqueField:
+    """A unique field found when compiling, with its values when they are countable."""
+
+    __slots__ = ("name", "distinct")
+
+    def __init__(self, name: str, distinct=None):
+        self.name = name
+        self.distinct = distinct
+
+
+class UniqueRun:
+    """The values taken by the unique fields of one run."""
+
+    def __init__(self, fields, count: int, exact_limit: int = DEFAULT_EXACT_LIMIT):
+        if not isinstance(exact_limit, int) or exact_limit < 0:
+            raise ValueError(f"unique_exact_limit must be a positive integer or 0: {exact_limit}")
+        self.fields = fields
+        self.trackers = [_make_tracker(field, count, exact_limit) for field in fields]
+
+    def accept(self, values) -> bool:
+        """
+        Take the (field index, value) pairs of a record when none of them was taken before,
+        also not within the record, and return whether they were taken.
+        """
+        keys = []
+        for index, value in values:
+            key = (index, self.trackers[index].key(value))
+            if key in keys or self.trackers[index].contains(key[1]):
+                return False
+            keys.append(key)
+
+        for index, key in keys:
+            self.trackers[index].add(key)
+        return True
+
+    def take(self, index: int, value) -> bool:
+        """Take a value of a field when it was not taken before, and return whether it was."""
+        tracker = self.trackers[index]
+        key = tracker.key(value)
+        if tracker.contains(key):
+            return False
+        tracker.add(key)
+        return True
+
+    def take_next(self, index: int, value):
+        """
+        Take and return the first value of an integer range after a value that was taken,
+        going on from the start of the range, or None when the field has no range.
+        """
+        tracker = self.trackers[index]
+        if not isinstance(tracker, RangeBitmap):
+            return None
+        key = tracker.key(value)
+        if type(key) is not int:
+            return None
+        key = tracker.next_free(key)
+        if key is None:
+            return None
+        tracker.add(key)
+        return tracker.values[key]
+
+    def error(self, index: int, field: int) -> ValueError:
+        return ValueError(
+            f"Could not make a unique value for {self.fields[field].name} in record {index} "
+            f"in {UNIQUE_MAX_ATTEMPTS} attempts, the field needs more possible values"
+        )
+
+
+class ExactSet:
+    __slots__ = ("seen",)
+
+    def __init__(self):
+        self.seen = set()
+
+    def key(self, value):
+        return unique_key(value)
+
+    def contains(self, key) -> bool:
+        return key in self.seen
+
+    def add(self, key):
+        self.seen.add(key)
+
+
+class RangeBitmap:
+    """One bit per value of an integer range. Values outside it are kept in a set."""
+
+    __slots__ = ("values", "bits", "other")
+
+    def __init__(self, values: range):
+        self.values = values
+        self.bits = bytearray((len(values) + 7) // 8)
+        self.other = set()
+        if len(values) % 8:
+            # The bits after the range are taken, so next_free never returns them
+            self.bits[-1] = (0xFF << (len(values) % 8)) & 0xFF
+
+    def key(self, value):
+        if type(value) is int and value in self.values:
+            return self.values.index(value)
+        return unique_key(value)
+
+    def contains(self, key) -> bool:
+        if type(key) is int:
+            return bool(self.bits[key >> 3] & (1 << (key & 7)))
+        return key in self.other
+
+    def add(self, key):
+        if type(key) is int:
+            self.bits[key >> 3] |= 1 << (key & 7)
+        else:
+            self.other.add(key)
+
+    def next_free(self, key: int) -> int | None:
+        """Return the first key from key on that is not taken, or None when all are."""
+        bits = self.bits
+        # The bits before key in its own byte are treated as taken
+        byte = bits[key >> 3] | ((1 << (key & 7)) - 1)
+        if byte != 0xFF:
+            position = key >> 3
+        else:
+            found = _FREE_BYTE.search(bits, (key >> 3) + 1) or _FREE_BYTE.search(bits)
+            if found is None:
+                return None
+            position = found.start()
+            byte = bits[position]
+        # The lowest bit that is not set
+        return position * 8 + ((~byte & (byte + 1)).bit_length() - 1)
+
+
+class BloomFilter:
+    """A Bloom filter for about capacity values, with a stable hash of the JSON value."""
+
+    __slots__ = ("size", "bits")
+
+    def __init__(self, capacity: int):
+        self.size = max(capacity, 1) * BLOOM_BITS_PER_VALUE
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def key(self, value):
+        digest = hashlib.blake2b(_stable_json(value).encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "big")
+        second = int.from_bytes(digest[8:], "big") | 1
+        return tuple((first + i * second) % self.size for i in range(BLOOM_HASHES))
+
+    def contains(self, key) -> bool:
+        bits = self.bits
+        return all(bits[bit >> 3] & (1 << (bit & 7)) for bit in key)
+
+    def add(self, key):
+        for bit in key:
+            self.bits[bit >> 3] |= 1 << (bit & 7)
+
+
+def _make_tracker(field: UniqueField, count: int, exact_limit: int):
+    distinct = field.distinct
+    if isinstance(distinct, range) and len(distinct) <= BITMAP_MAX_VALUES:
+        return RangeBitmap(distinct)
+    if isinstance(distinct, (list, tuple)) or count <= exact_limit:
+        return ExactSet()
+    return BloomFilter(count)
+
+
+def _stable_json(value) -> str:
+    """JSON text that is the same for values unique_key treats as equal, in any process."""
+    return json.dumps(
+        _normalize(value), sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str
+    )
+
+
+def _normalize(value):
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    return value
@@ -0,0 +1,130 @@
+"""
+Functions for drawing whole arrays of simple items at once with NumPy
+
+NumPy is optional. Without it, or for items that are not simple, arrays are generated
+one item at a time by the plan nodes. NumPy is imported by is_available, which is called
+before any other function here, so runs without vectorized_arrays do not load it.
+"""
+
+import math
+
+np = None
+
+# Shorter arrays are faster to generate one item at a time
+VECTOR_MIN_LENGTH = 16
+
+# Integer bounds that are exact as floats and drawn in 64 bits
+INT_LIMIT = 2**53
+
+
+def is_available() -> bool:
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:  # NumPy is optional
+            return False
+        np = numpy
+    return True
+
+
+def make_rng(seed: int):
+    """Create the NumPy Generator for a SchemaGenerator, seeded from its random state."""
+    return np.random.default_rng(seed)
+
+
+def reseed(rng, seed: int):
+    """Reset a Generator from make_rng to the state make_rng(seed) would give."""
+    rng.bit_generator.state = np.random.default_rng(seed).bit_generator.state
+
+
+def compile_draw(rng, schema: dict, bounds):
+    """
+    Return a function draw(length, unique) that gives a list of values for the items schema,
+    or None if the schema is not a simple integer, number, boolean or enum schema.
+    bounds(schema) gives the (minimum, maximum) of a numeric schema.
+    Unique draws take values without replacement where the values are countable, so the
+    list can be shorter than length when there are not enough values.
+    """
+    if not isinstance(schema, dict) or any(
+        key in schema for key in ("$ref", "oneOf", "anyOf", "allOf")
+    ):
+        return None
+
+    if "enum" in schema:
+        values = schema["enum"]
+        if not isinstance(values, list) or not values:
+            return None
+        return _draw_indexed(rng, values)
+
+    schema_type = schema.get("type")
+    if schema_type == "boolean":
+        return _draw_indexed(rng, [False, True])
+
+    if schema_type not in ("integer", "number"):
+        return None
+
+    min_val, max_val = bounds(schema)
+    is_integer = schema_type == "integer"
+    multiple_of = schema.get("multipleOf")
+
+    if multiple_of:
+        start = math.ceil(min_val / multiple_of)
+        end = max(math.floor(max_val / multiple_of), start)
+        if max(abs(start), abs(end)) * abs(multiple_of) >= INT_LIMIT:
+            return None
+        return _draw_multiples(rng, multiple_of, start, end, is_integer)
+
+    if is_integer:
+        if max(abs(min_val), abs(max_val)) >= INT_LIMIT:
+            return None
+        return _draw_integers(rng, min_val, max_val)
+
+    def draw(length, unique):
+        return rng.uniform(min_val, max_val, length).tolist()
+
+    return draw
+
+
+def _draw_indexed(rng, values):
+    def draw(length, unique):
+        if unique:
+            length = min(length, len(values))
+            indexes = rng.choice(len(values), length, replace=False)
+        else:
+            indexes = rng.integers(0, len(values), length)
+        return [values[i] for i in indexes.tolist()]
+
+    return draw
+
+
+def _draw_integers(rng, min_val, max_val):
+    # The integers the schema allows, as NumberNode.low and high
+    low = math.ceil(min_val)
+    high = math.floor(max_val)
+    if high < low:
+        return None  # No integer fits, the items fall back one at a time
+    count = high + 1 - low
+
+    def draw(length, unique):
+        if unique:
+            return (rng.choice(count, min(length, count), replace=False) + low).tolist()
+        return rng.integers(low, high, length, endpoint=True).tolist()
+
+    return draw
+
+
+def _draw_multiples(rng, multiple_of, start, end, is_integer):
+    count = end - start + 1
+
+    def draw(length, unique):
+        if unique:
+            factors = rng.choice(count, min(length, count), replace=False) + start
+        else:
+            factors = rng.integers(start, end, length, endpoint=True)
+        values = factors * multiple_of
+        if is_integer:
+            values = np.floor(values).astype(np.int64)
+        return values.tolist()
+
+    return draw
@@ -1,6 +1,7 @@
 import os
 import subprocess
 import sys
+import tempfile
 import time
 import hashlib
 import json
@@ -63,37 +64,38 @@ def hash_file(path: str) -> str:
 # ----------------------------
 def run(json_files, script_path, config_file, base_dir):
     results = []
-    total = len(json_files)
 
-    for i, file in enumerate(json_files, 1):
-        # inline progress (no thread, no spinner overhead)
-        print(f"\rProcessing {i}/{total}", end="", flush=True)
+    # One batch run generates all files, mirroring the folders under out_dir
+    root = os.path.commonpath([os.path.dirname(f) for f in json_files])
 
+    with tempfile.TemporaryDirectory() as out_dir:
+        # The directory is searched by batch itself, a list of thousands of schema paths
+        # would go over the command line length limit of Windows
         cmd = [
             sys.executable,  # avoids hardcoding "python"
             script_path,
+            "batch",
             "--config",
             config_file,
-            file
+            "--out-dir",
+            out_dir,
+            base_dir,
         ]
 
-        try:
-            out = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                check=True
-            ).stdout
+        # Failed schemas are logged and have no output file
+        subprocess.run(cmd, check=False)
 
-        except subprocess.CalledProcessError as e:
-            print(f"\n❌ Failed: {file}")
-            print(e.stderr)
-            sys.exit(1)
+        for file in json_files:
+            out_path = os.path.join(out_dir, os.path.relpath(file, root))
+            rel = os.path.relpath(file, base_dir)
+            if not os.path.exists(out_path):
+                print(f"❌ Failed: {file}")
+                results.append(f"{rel}|failed")
+                continue
 
-        rel = os.path.relpath(file, base_dir)
-        results.append(f"{rel}|{hash_text(out)}")
+            with open(out_path, "r", encoding="utf-8") as f:
+                results.append(f"{rel}|{hash_text(f.read())}")
 
-    print()  # newline after progress
     return results
 
 
@@ -1,6 +1,7 @@
 import os
 import subprocess
 import sys
+import tempfile
 import time
 import json
 
@@ -22,31 +23,24 @@ def load_config(path):
     return cfg
 
 
-def list_json_files(directory):
-    return [
-        os.path.join(root, f)
-        for root, _, files in os.walk(directory)
-        for f in files
-        if f.endswith(".json")
-    ]
-
-
-def run_mocka_on_files(json_files, script_path, config_file):
-    for _, file in enumerate(json_files, 1):
-
+def run_mocka_batch(directory, script_path, config_file):
+    with tempfile.TemporaryDirectory() as out_dir:
         cmd = [
             sys.executable,
             script_path,
+            "batch",
             "--config",
             config_file,
-            file
+            "--out-dir",
+            out_dir,
+            directory
         ]
 
         try:
             subprocess.run(cmd, check=True)
 
         except subprocess.CalledProcessError as e:
-            print(f"\n❌ Error while processing: {file}")
+            print(f"\n❌ Error while processing: {directory}")
             print(e)
             sys.exit(1)
 
@@ -64,13 +58,7 @@ def main():
 
     print(f"🔍 Scanning {directory_to_scan}")
 
-    json_files = list_json_files(directory_to_scan)
-
-    if not json_files:
-        print("⚠️ No JSON files found.")
-        return
-
-    run_mocka_on_files(json_files, script_path, config_file)
+    run_mocka_batch(directory_to_scan, script_path, config_file)
 
     print(f"\n✅ Done. Total runtime: {time.time() - start_time:.2f} seconds.")
 